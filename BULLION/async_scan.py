@@ -0,0 +1,143 @@
+"""Async scan pipeline for the scanner endpoints.
+
+Broker I/O goes through one httpx.AsyncClient per scan, paced by the shared
+rate limiter and bounded by a semaphore, and results are yielded in completion
+order so the HTTP response can stream them instead of waiting for the slowest
+symbol. Session handling stays with session_manager; only the REST calls the
+scan needs are reimplemented here.
+"""
+import os
+import queue
+import asyncio
+import threading
+import contextlib
+import httpx
+from session_manager import smartApi, session, is_auth_error
+from rate_limiter import limiter, is_rate_limit_error
+from candle_loader import load_candles_async, candle_payload, parse_candles
+from instruments import lookup_token
+from metrics import timed, STAGE_SECONDS
+
+ASYNC_SCAN_CONCURRENCY = int(os.getenv("ASYNC_SCAN_CONCURRENCY", "32"))
+BROKER_TIMEOUT = float(os.getenv("BROKER_TIMEOUT", "10"))
+
+
+class AsyncBroker:
+    """getCandleData / searchScrip over httpx, sharing the SmartConnect session."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _post(self, route, payload):
+        url = smartApi.root + smartApi._routes[route]
+        for attempt in range(2):
+            token = session.jwt_token
+            # requests silently drops None headers (e.g. an unset API key); httpx rejects them
+            headers = {k: v for k, v in smartApi.requestHeaders().items() if v is not None}
+            headers["Authorization"] = f"Bearer {smartApi.access_token}"
+            r = await self.client.post(url, json=payload, headers=headers)
+            try:
+                data = r.json()
+            except ValueError:
+                # SmartAPI answers rate-limit rejections with plain text
+                data = {"status": False, "message": r.text}
+            # Rate-limit rejections also come back as 403; those are the limiter's to retry
+            if attempt == 0 and not is_rate_limit_error(data) and (is_auth_error(data) or r.status_code in (401, 403)):
+                await asyncio.to_thread(session.invalidate, token)
+                if await asyncio.to_thread(session.ensure):
+                    continue
+            return data
+
+    async def fetch_candles(self, exchange, token, from_dt, to_dt, interval):
+        payload = candle_payload(exchange, token, from_dt, to_dt, interval)
+        return parse_candles(await limiter.call_async("getCandleData", self._post, "api.candle.data", payload))
+
+    async def symbol_token(self, exchange, trading_symbol):
+        token = lookup_token(exchange, trading_symbol)
+        if token:
+            return token
+        payload = {"exchange": exchange, "searchscrip": trading_symbol}
+        sr = await limiter.call_async("searchScrip", self._post, "api.search.scrip", payload)
+        for s in (sr or {}).get("data") or []:
+            if s.get("tradingsymbol") == trading_symbol:
+                return s.get("symboltoken")
+        return None
+
+
+async def scan_async(symbols, analyze, from_dt, to_dt, interval, concurrency=ASYNC_SCAN_CONCURRENCY):
+    """Yield (index, analyze(trading_symbol, candles)) for every watchlist row as soon as it is ready."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=BROKER_TIMEOUT) as client:
+        broker = AsyncBroker(client)
+
+        async def one(i, s):
+            trading_symbol = s["trading_symbol"]
+            async with sem:
+                try:
+                    with timed(STAGE_SECONDS, stage="token_lookup"):
+                        token = s.get("symbol_token") or await broker.symbol_token(s["exchange"], trading_symbol)
+                    if not token:
+                        return i, {"symbol": trading_symbol, "eligible": False, "reason": "token_not_found"}
+                    with timed(STAGE_SECONDS, stage="candle_fetch"):
+                        candles = await load_candles_async(s["exchange"], token, from_dt, to_dt, interval,
+                                                           broker.fetch_candles)
+                except Exception as e:
+                    print(f"Async scan error for {trading_symbol}: {e}")
+                    candles = []
+            with timed(STAGE_SECONDS, stage="analysis"):
+                return i, analyze(trading_symbol, candles)
+
+        tasks = [asyncio.ensure_future(one(i, s)) for i, s in enumerate(symbols)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            # Closed early (the reader left): stop the symbols still queued or in flight
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def stream_scan(symbols, analyze, from_dt, to_dt, interval, concurrency=ASYNC_SCAN_CONCURRENCY):
+    """Blocking generator over scan_async for WSGI views; the event loop runs on its own thread.
+
+    At most `concurrency` results wait for the reader. Closing the generator
+    (the client went away) stops the scan, so no more broker calls are made
+    for results nobody will read.
+    """
+    results = queue.Queue(maxsize=concurrency)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def produce():
+        try:
+            async with contextlib.aclosing(scan_async(symbols, analyze, from_dt, to_dt, interval, concurrency)) as scan:
+                async for r in scan:
+                    if not await asyncio.to_thread(put, r):
+                        break
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    threading.Thread(target=asyncio.run, args=(produce(),), daemon=True, name="stream-scan").start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
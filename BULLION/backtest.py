@@ -0,0 +1,234 @@
+"""Offline backtest of the Shooting Star strategy over the local candle store.
+
+Signals are the scanner's rules (pattern_engine masks, i.e. is_uptrend and
+is_shooting_star) evaluated at every bar of an N x T batch. Each signal places
+a sell-stop at compute_levels' entry, valid for ENTRY_BARS bars. Once filled,
+the trade exits at the stop, at the target, or at the close after MAX_HOLD
+bars. All signals are simulated together on (signals x window) arrays, so the
+only per-parameter work in a sweep is recomputing the levels. Nothing here
+talks to the broker.
+
+Conventions: a sell-stop that gaps through fills at the open. A bar that
+touches both stop and target counts as a stop, and a fill that gaps below
+the target closes at the fill price. Signals are independent one-unit trades
+with no position sizing or overlap rules. Results are in R, the multiple of
+the risk taken at entry.
+"""
+import os
+import time
+import argparse
+import datetime as dt
+import numpy as np
+
+from candle_store import store, to_millis
+from pattern_engine import (CandleBatch, uptrend_mask, shooting_star_mask, rounded_level_arrays,
+                            MIN_BARS, TREND_BARS, UPPER_SHADOW_RATIO, LOWER_SHADOW_RATIO)
+from strategy import ENTRY_BUFFER, RISK_REWARD, INTERVAL
+
+ENTRY_BARS = int(os.getenv("BACKTEST_ENTRY_BARS", "3"))     # bars the sell-stop stays live after the signal
+MAX_HOLD = int(os.getenv("BACKTEST_MAX_HOLD", "20"))         # bars a filled trade is held at most
+BACKTEST_YEARS = 10
+
+
+def load_batch(symbols, interval=INTERVAL, start=None, end=None):
+    """CandleBatch straight from the store's Parquet files for watchlist rows.
+
+    Unlike CandleBatch.from_candles, `time` is an int64 epoch-ms array (0 for padding).
+    """
+    tables = [store.read_table(s["exchange"], s["symbol_token"], interval, start, end) for s in symbols]
+    n = len(tables)
+    width = max((t.num_rows for t in tables), default=0)
+    cols = {k: np.full((n, width), np.nan) for k in ("open", "high", "low", "close", "volume")}
+    times = np.zeros((n, width), dtype=np.int64)
+    lengths = np.zeros(n, dtype=np.int64)
+    for i, table in enumerate(tables):
+        m = table.num_rows
+        lengths[i] = m
+        if not m:
+            continue
+        for k, arr in cols.items():
+            arr[i, width - m:] = table[k].to_numpy()
+        times[i, width - m:] = table["time"].to_numpy()
+    return CandleBatch(times, cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"], lengths)
+
+
+def signal_mask(batch, trend_bars=TREND_BARS, upper_ratio=UPPER_SHADOW_RATIO, lower_ratio=LOWER_SHADOW_RATIO,
+                min_bars=MIN_BARS):
+    """mask[i, t]: bar t is a Shooting Star after `trend_bars` rising closes, with at least
+    `min_bars` bars up to and including it (as analyze_candles)."""
+    n, t = batch.shape
+    mask = np.zeros((n, t), dtype=bool)
+    if t <= trend_bars:
+        return mask
+    rising = uptrend_mask(batch.close, trend_bars)
+    mask[:, 1:] = rising[:, :-1]
+    # Bars are right-aligned: row i's first real bar is at column t - lengths[i]
+    history = np.arange(1, t + 1)[None, :] - (t - np.asarray(batch.lengths))[:, None]
+    mask &= history >= min_bars
+    return mask & shooting_star_mask(batch.open, batch.high, batch.low, batch.close, upper_ratio, lower_ratio)
+
+
+class Signals:
+    """Forward windows of every signal, built once and reused for any entry/exit parameters."""
+
+    __slots__ = ("row", "bar", "time", "low", "high", "high_ahead", "low_ahead",
+                 "open_ahead", "close_ahead", "time_ahead", "entry_bars", "max_hold")
+
+    def __init__(self, batch, entry_bars=ENTRY_BARS, max_hold=MAX_HOLD, trend_bars=TREND_BARS,
+                 upper_ratio=UPPER_SHADOW_RATIO, lower_ratio=LOWER_SHADOW_RATIO, min_bars=MIN_BARS):
+        self.entry_bars = entry_bars
+        self.max_hold = max_hold
+        self.row, self.bar = np.nonzero(signal_mask(batch, trend_bars, upper_ratio, lower_ratio, min_bars))
+        self.time = batch.time[self.row, self.bar]
+        self.low = batch.low[self.row, self.bar]
+        self.high = batch.high[self.row, self.bar]
+
+        # Bars t+1 .. t+entry_bars+max_hold-1 after each signal, NaN past the end of the data
+        width = entry_bars + max_hold - 1
+        n, t = batch.shape
+        ahead = self.bar[:, None] + 1 + np.arange(width)[None, :]
+        valid = ahead < t
+        ahead = np.minimum(ahead, t - 1)
+        rows = self.row[:, None]
+
+        def take(arr, fill):
+            out = arr[rows, ahead]
+            return np.where(valid, out, fill)
+
+        self.open_ahead = take(batch.open, np.nan)
+        self.high_ahead = take(batch.high, np.nan)
+        self.low_ahead = take(batch.low, np.nan)
+        self.close_ahead = take(batch.close, np.nan)
+        self.time_ahead = take(batch.time, 0)
+
+    def __len__(self):
+        return len(self.row)
+
+
+def simulate(signals, entry_buffer=ENTRY_BUFFER, risk_reward=RISK_REWARD):
+    """Fill and exit every signal. Returns a dict of per-trade arrays for the filled, closed trades."""
+    entry, stop, target = rounded_level_arrays(signals.low, signals.high, entry_buffer, risk_reward)
+
+    s = len(signals)
+    width = signals.entry_bars + signals.max_hold - 1
+    cols = np.arange(width)[None, :]
+    with np.errstate(invalid="ignore"):
+        # Fill: first bar within entry_bars whose low reaches the sell-stop
+        touched = signals.low_ahead[:, :signals.entry_bars] <= entry[:, None]
+        filled = touched.any(axis=1)
+        fill_at = touched.argmax(axis=1)
+        fill_open = signals.open_ahead[np.arange(s), fill_at]
+        fill_price = np.where(fill_open < entry, fill_open, entry)
+
+        # Exit: first bar from the fill bar on that hits stop or target
+        live = (cols >= fill_at[:, None]) & (cols < fill_at[:, None] + signals.max_hold)
+        hit_stop = live & (signals.high_ahead >= stop[:, None])
+        hit_target = live & (signals.low_ahead <= target[:, None])
+        hit = hit_stop | hit_target
+        exited = hit.any(axis=1)
+        exit_at = np.where(exited, hit.argmax(axis=1), np.minimum(fill_at + signals.max_hold - 1, width - 1))
+
+    idx = np.arange(s)
+    exit_open = signals.open_ahead[idx, exit_at]
+    gapped = exit_at > fill_at
+    is_stop = exited & hit_stop[idx, exit_at]
+    is_target = exited & ~is_stop
+    exit_price = np.where(is_stop, np.where(gapped & (exit_open > stop), exit_open, stop),
+                          np.where(is_target, np.where(gapped, np.minimum(exit_open, target),
+                                                       np.minimum(fill_price, target)),
+                                   signals.close_ahead[idx, exit_at]))
+
+    # A trade whose window runs past the data is still open; leave it out
+    closed = filled & ~np.isnan(exit_price)
+    risk = stop - fill_price
+    keep = closed & (risk > 0)
+    return {
+        "row": signals.row[keep],
+        "signal_time": signals.time[keep],
+        "exit_time": signals.time_ahead[idx, exit_at][keep],
+        "entry": fill_price[keep],
+        "exit": exit_price[keep],
+        "outcome": np.where(is_stop, "stop", np.where(is_target, "target", "timeout"))[keep],
+        "r": ((fill_price - exit_price) / risk)[keep],
+        "pct": ((fill_price - exit_price) / fill_price)[keep],
+        "signals": s,
+        "filled": int(filled.sum()),
+    }
+
+
+def summarize(trades):
+    """Hit rate, expectancy and max drawdown (equity in R, trades ordered by exit time)."""
+    r = trades["r"]
+    n = len(r)
+    if not n:
+        return {"signals": trades["signals"], "filled": trades["filled"], "trades": 0, "hit_rate": None,
+                "expectancy_r": None, "expectancy_pct": None, "total_r": 0.0, "max_drawdown_r": 0.0}
+    equity = np.cumsum(r[np.argsort(trades["exit_time"], kind="stable")])
+    drawdown = np.maximum.accumulate(np.r_[0.0, equity])[1:] - equity
+    outcomes = trades["outcome"]
+    return {
+        "signals": trades["signals"],
+        "filled": trades["filled"],
+        "trades": n,
+        "targets": int((outcomes == "target").sum()),
+        "stops": int((outcomes == "stop").sum()),
+        "timeouts": int((outcomes == "timeout").sum()),
+        "hit_rate": round(float((r > 0).mean()), 4),
+        "expectancy_r": round(float(r.mean()), 4),
+        "expectancy_pct": round(float(trades["pct"].mean()) * 100, 4),
+        "total_r": round(float(r.sum()), 4),
+        "max_drawdown_r": round(float(max(drawdown.max(), 0.0)), 4),
+    }
+
+
+def run_backtest(batch, entry_buffer=ENTRY_BUFFER, risk_reward=RISK_REWARD,
+                 entry_bars=ENTRY_BARS, max_hold=MAX_HOLD):
+    return summarize(simulate(Signals(batch, entry_bars, max_hold), entry_buffer, risk_reward))
+
+
+def sweep(batch, entry_buffers, risk_rewards, entry_bars=ENTRY_BARS, max_hold=MAX_HOLD):
+    """Summary for every (entry_buffer, risk_reward) pair, sharing one signal extraction."""
+    signals = Signals(batch, entry_bars, max_hold)
+    results = []
+    for buffer in entry_buffers:
+        for rr in risk_rewards:
+            results.append({"entry_buffer": buffer, "risk_reward": rr,
+                            **summarize(simulate(signals, buffer, rr))})
+    return results
+
+
+def _floats(text):
+    return [float(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the Shooting Star strategy on stored candles.")
+    parser.add_argument("--list", default=None, help="watchlist name (default: every series in the store)")
+    parser.add_argument("--years", type=float, default=BACKTEST_YEARS)
+    parser.add_argument("--buffer", type=_floats, default=[ENTRY_BUFFER], help="entry buffer(s), comma separated")
+    parser.add_argument("--rr", type=_floats, default=[RISK_REWARD], help="risk/reward ratio(s), comma separated")
+    parser.add_argument("--entry-bars", type=int, default=ENTRY_BARS)
+    parser.add_argument("--max-hold", type=int, default=MAX_HOLD)
+    args = parser.parse_args()
+
+    if args.list:
+        from shooting_star import get_watchlist
+        symbols = get_watchlist(args.list)
+    else:
+        symbols = [{"exchange": ex, "symbol_token": token} for ex, token in store.series(INTERVAL)]
+    start = to_millis(dt.datetime.now() - dt.timedelta(days=365 * args.years))
+
+    t0 = time.perf_counter()
+    batch = load_batch(symbols, INTERVAL, start=start)
+    t1 = time.perf_counter()
+    results = sweep(batch, args.buffer, args.rr, args.entry_bars, args.max_hold)
+    t2 = time.perf_counter()
+
+    print(f"{len(symbols)} symbols, {int(batch.lengths.sum())} bars: load {t1 - t0:.2f}s, backtest {t2 - t1:.2f}s")
+    for r in sorted(results, key=lambda r: r["expectancy_r"] if r["expectancy_r"] is not None else -np.inf,
+                    reverse=True):
+        print(r)
+
+
+if __name__ == "__main__":
+    main()
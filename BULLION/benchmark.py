@@ -0,0 +1,262 @@
+"""Throughput and latency benchmark against a fake SmartAPI.
+
+Starts fake_smartapi on a local port, points the apps at it through their
+usual environment variables (SMART_API_ROOT, SCRIP_MASTER_URL) with a
+throwaway SQLite database, candle store and scan directory, and seeds one
+watchlist per scale. Each scale uses its own symbols, so every scale starts
+cold. Requests go through the Flask test clients, so the numbers cover
+the whole app (watchlist, loader, store, scan cache, JSON) minus a real socket
+on the client side, while every broker call crosses HTTP to the fake.
+
+For each scale it measures:
+  shooting_star_cold  first scan of the list (broker bound)
+  shooting_star_warm  repeated scans served from the scan cache
+  shooting_star_304   repeated scans with If-None-Match
+  candles             /api/candles for a sample of the list
+  search              /search prefix queries
+  ltp                 /ltp for a sample of the list
+
+and reports p50/p99 latency, symbols/sec and the broker calls made (per
+scan for the scan rows). --json writes the report for CI; --baseline
+compares against an earlier report and exits 1 on a regression beyond
+--tolerance.
+
+    python benchmark.py --scales 10,100 --json bench.json
+    python benchmark.py --scales 10,100 --baseline bench.json --tolerance 0.3
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+SCALES = [10, 100, 1000, 10000]
+# Broker limits high enough that a 10,000-symbol cold scan finishes in under a minute
+BENCH_RATES = {"getCandleData": 250.0, "searchScrip": 20.0, "ltpData": 250.0}
+
+
+def configure(workdir, rates):
+    """Environment for the apps; must run before any BULLION module is imported."""
+    os.environ.update({
+        "SMART_API_KEY": "bench",
+        "SMART_API_CLIENT_ID": "BENCH",
+        "SMART_PIN": "0000",
+        "SMART_TOTP_SECRET": "JBSWY3DPEHPK3PXP",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bullion.db')}",
+        "CANDLE_STORE_DIR": os.path.join(workdir, "candles"),
+        "SCAN_RESULTS_DIR": os.path.join(workdir, "scans"),
+        "INSTRUMENTS_FILE": os.path.join(workdir, "instruments.json"),
+        "LIVE_FEED": "0",
+    })
+    for name, rate in rates.items():
+        os.environ[f"RATE_LIMIT_{name.upper()}"] = str(rate)
+
+
+def point_at(root):
+    os.environ.update({"SMART_API_ROOT": root, "SCRIP_MASTER_URL": f"{root}/scrip_master.json"})
+
+
+def create_schema(engine):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE lists (list_name VARCHAR(100) PRIMARY KEY, stocks INTEGER DEFAULT 0)"))
+        conn.execute(text("""
+            CREATE TABLE stocks (id INTEGER PRIMARY KEY, list_name VARCHAR(100), stock_name VARCHAR(100),
+                                 exchange VARCHAR(10), trading_symbol VARCHAR(50), symbol_token VARCHAR(20),
+                                 instrument_type VARCHAR(10))
+        """))
+        conn.execute(text("""
+            CREATE TABLE candles (trading_symbol VARCHAR(50), exchange VARCHAR(10), symbol_token VARCHAR(20),
+                                  candle_time BIGINT, open_price DOUBLE, high_price DOUBLE, low_price DOUBLE,
+                                  close_price DOUBLE, PRIMARY KEY (exchange, symbol_token, candle_time))
+        """))
+
+
+def seed_list(engine, list_name, offset, n):
+    """A watchlist of n fake symbols starting at symbol number `offset`."""
+    from sqlalchemy import text
+    from fake_smartapi import symbol_name, TOKEN_BASE
+    rows = [{"ln": list_name, "name": symbol_name(i), "ts": f"{symbol_name(i)}-EQ", "token": str(TOKEN_BASE + i)}
+            for i in range(offset, offset + n)]
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO lists (list_name, stocks) VALUES (:ln, :n)"), {"ln": list_name, "n": n})
+        conn.execute(text("""
+            INSERT INTO stocks (list_name, stock_name, exchange, trading_symbol, symbol_token, instrument_type)
+            VALUES (:ln, :name, 'NSE', :ts, :token, 'EQ')
+        """), rows)
+    return rows
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def summarize(name, scale, latencies, broker_calls, symbols=None, scans=None, errors=0):
+    lat = np.asarray(latencies) if latencies else np.zeros(1)
+    row = {"endpoint": name, "scale": scale, "requests": len(latencies), "errors": errors,
+           "p50_ms": _ms(np.percentile(lat, 50)), "p99_ms": _ms(np.percentile(lat, 99)),
+           "broker_calls": broker_calls}
+    if symbols is not None:
+        row["symbols_per_sec"] = round(symbols / max(lat.sum(), 1e-9), 1)
+    if scans:
+        row["broker_calls_per_scan"] = round(broker_calls / scans, 2)
+    return row
+
+
+class Bench:
+
+    def __init__(self, fake, args):
+        # Imported only now, after configure(), so the apps pick up the fake's settings
+        import main
+        import shooting_star
+        import database
+        import instruments
+        self.fake = fake
+        self.args = args
+        self.main = main.app.test_client()
+        self.scanner = shooting_star.app.test_client()
+        self.engine = database.engine
+        create_schema(self.engine)
+        instruments.refresh()
+        self.random = random.Random(args.seed)
+
+    def broker_calls(self, before, names=("getCandleData", "searchScrip", "ltpData")):
+        after = self.fake.stats()
+        return sum(after[n]["requests"] - before[n]["requests"] for n in names)
+
+    def timed(self, calls):
+        """Run (client, method, path, kwargs) requests; returns latencies, error count, broker calls."""
+        before = self.fake.stats()
+        latencies, errors, responses = [], 0, []
+        for client, method, path, kwargs in calls:
+            start = time.perf_counter()
+            resp = client.open(path, method=method, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                errors += 1
+            responses.append(resp)
+        return latencies, errors, self.broker_calls(before), responses
+
+    def run_scale(self, scale, offset):
+        list_name = f"bench-{scale}"
+        rows = seed_list(self.engine, list_name, offset, scale)
+        scan = (self.scanner, "POST", "/api/shooting_star", {"json": {"list": list_name}})
+        report = []
+
+        lat, err, calls, resp = self.timed([scan])
+        report.append(summarize("shooting_star_cold", scale, lat, calls, scale, 1, err))
+        etag = resp[0].headers.get("ETag")
+
+        repeats = self.args.repeats
+        lat, err, calls, _ = self.timed([scan] * repeats)
+        report.append(summarize("shooting_star_warm", scale, lat, calls, scale * repeats, repeats, err))
+
+        conditional = (self.scanner, "POST", "/api/shooting_star",
+                       {"json": {"list": list_name}, "headers": {"If-None-Match": etag or ""}})
+        lat, err, calls, _ = self.timed([conditional] * repeats)
+        report.append(summarize("shooting_star_304", scale, lat, calls, scale * repeats, repeats, err))
+
+        sample = self.random.sample(rows, min(scale, self.args.requests))
+        lat, err, calls, _ = self.timed([(self.main, "GET", f"/api/candles/NSE/{r['ts']}", {}) for r in sample])
+        report.append(summarize("candles", scale, lat, calls, len(sample), errors=err))
+
+        queries = [r["name"][:-self.random.randint(1, 3)] for r in sample]
+        lat, err, calls, _ = self.timed([(self.main, "POST", "/search", {"json": {"name": q}}) for q in queries])
+        report.append(summarize("search", scale, lat, calls, errors=err))
+
+        lat, err, calls, _ = self.timed([(self.main, "POST", "/ltp", {"json": {"tradingsymbol": r["ts"]}})
+                                         for r in sample])
+        report.append(summarize("ltp", scale, lat, calls, len(sample), errors=err))
+        return report
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against a baseline report, as messages."""
+    base = {(r["endpoint"], r["scale"]): r for r in baseline.get("results", [])}
+    problems = []
+    for r in results:
+        b = base.get((r["endpoint"], r["scale"]))
+        if not b:
+            continue
+        label = f"{r['endpoint']}@{r['scale']}"
+        if r["p99_ms"] > b["p99_ms"] * (1 + tolerance):
+            problems.append(f"{label}: p99 {r['p99_ms']}ms vs {b['p99_ms']}ms")
+        if "symbols_per_sec" in b and r["symbols_per_sec"] < b["symbols_per_sec"] * (1 - tolerance):
+            problems.append(f"{label}: {r['symbols_per_sec']} symbols/s vs {b['symbols_per_sec']}")
+        if "broker_calls_per_scan" in b and r["broker_calls_per_scan"] > b["broker_calls_per_scan"]:
+            problems.append(f"{label}: {r['broker_calls_per_scan']} broker calls/scan vs {b['broker_calls_per_scan']}")
+        if r["errors"] > b["errors"]:
+            problems.append(f"{label}: {r['errors']} errors vs {b['errors']}")
+    return problems
+
+
+def print_table(results):
+    columns = ("endpoint", "scale", "requests", "errors", "p50_ms", "p99_ms", "symbols_per_sec",
+               "broker_calls", "broker_calls_per_scan")
+    print(" ".join(f"{c:>21}" if i == 0 else f"{c:>14}" for i, c in enumerate(columns)))
+    for r in results:
+        print(" ".join(f"{str(r.get(c, '-')):>21}" if i == 0 else f"{str(r.get(c, '-')):>14}"
+                       for i, c in enumerate(columns)))
+
+
+def _ints(text):
+    return [int(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scanner and API against a fake SmartAPI.")
+    parser.add_argument("--scales", type=_ints, default=SCALES, help="watchlist sizes, comma separated")
+    parser.add_argument("--repeats", type=int, default=20, help="warm scans per scale")
+    parser.add_argument("--requests", type=int, default=200, help="candles/search/ltp requests per scale")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake broker latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate", action="append",
+                        help="broker limit per endpoint, e.g. getCandleData=3 (the apps' limiter uses the same)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of broker calls that fail")
+    parser.add_argument("--auth-error-rate", type=float, default=0.0, help="fraction rejected as expired tokens")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="write the report here")
+    parser.add_argument("--baseline", default=None, help="earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bullion-bench-")
+    configure(workdir, BENCH_RATES)
+    from fake_smartapi import FakeSmartAPI, _rates     # after configure: candle_store reads CANDLE_STORE_DIR on import
+    rates = dict(BENCH_RATES, **_rates(args.rate))
+    configure(workdir, rates)
+    fake = FakeSmartAPI(args.latency_ms, args.jitter_ms, rates, args.error_rate, args.auth_error_rate,
+                        symbols=max(sum(args.scales), 1), seed=args.seed)
+    point_at(fake.start())
+
+    bench = Bench(fake, args)
+    results = []
+    offset = 0
+    for scale in args.scales:
+        results.extend(bench.run_scale(scale, offset))
+        offset += scale
+    fake.stop()
+
+    print_table(results)
+    report = {"config": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "rates": rates,
+                         "error_rate": args.error_rate, "auth_error_rate": args.auth_error_rate,
+                         "repeats": args.repeats, "requests": args.requests},
+              "broker": fake.stats(), "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print("REGRESSION", p)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
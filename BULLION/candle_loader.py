@@ -0,0 +1,216 @@
+"""Incremental candle loading on top of the local candle store.
+
+Every (exchange, symbol_token, interval) series keeps a watermark: the last bar
+the broker returned and when it was last asked. A call only goes to the broker
+when a new bar can have closed since then (or, during the session, to re-poll
+the bar that is still forming), asks only for bars from the watermark onwards,
+and merges them into an in-memory copy of the series. History older than
+anything fetched so far is backfilled through the store's coverage gaps.
+Series are returned as CandleSeries views of that copy.
+"""
+import os
+import time
+import asyncio
+import threading
+import datetime as dt
+from session_manager import smartApi, session
+from rate_limiter import limiter
+from candle_store import store, settled_until, to_millis, next_bar_due, market_open, IST
+from candle_series import CandleSeries
+from resample import RESAMPLED, BASE_INTERVAL, Resampled
+
+WATERMARK_REFRESH = int(os.getenv("WATERMARK_REFRESH_SECONDS", "60"))  # re-poll a forming bar at most this often
+
+# Longest range SmartAPI serves in one getCandleData call, per interval
+MAX_DAYS_PER_REQUEST = {
+    "ONE_MINUTE": 30, "THREE_MINUTE": 60, "FIVE_MINUTE": 100, "TEN_MINUTE": 100,
+    "FIFTEEN_MINUTE": 200, "THIRTY_MINUTE": 200, "ONE_HOUR": 400, "ONE_DAY": 2000,
+}
+
+_series = {}            # key -> {"start": ms, "bars": CandleSeries, "mark": watermark}
+_resampled = {}         # (exchange, token, interval) -> Resampled, for intervals built from BASE_INTERVAL
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _local(millis):
+    """SmartAPI takes naive exchange-local (IST) from/to dates."""
+    return dt.datetime.fromtimestamp(millis / 1000, IST).replace(tzinfo=None)
+
+
+def fetch_candles(exchange, token, from_dt, to_dt, interval):
+    """Fetch candles for [from_dt, to_dt] from the broker. Returns None if the call failed."""
+    payload = candle_payload(exchange, token, from_dt, to_dt, interval)
+    return parse_candles(limiter.call("getCandleData", session.call, smartApi.getCandleData, payload))
+
+
+def candle_payload(exchange, token, from_dt, to_dt, interval):
+    return {
+        "exchange": exchange,
+        "symboltoken": str(token),
+        "interval": interval,
+        "fromdate": from_dt.strftime("%Y-%m-%d %H:%M"),
+        "todate": to_dt.strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def parse_candles(resp):
+    """getCandleData response -> CandleSeries, or None if the call failed."""
+    if not resp or resp.get("status") is False:
+        return None
+    return CandleSeries.from_broker(resp.get("data"))
+
+
+def _store_rows(key, start_ms, end_ms, rows, on_fetch):
+    exchange, token, interval = key
+    settled = settled_until(interval)
+    covered = (start_ms, min(end_ms, settled)) if settled >= start_ms else None
+    store.append(exchange, token, interval, rows, covered=covered)
+    if on_fetch and len(rows):
+        on_fetch(rows)
+
+
+def _needs_refresh(mark, interval, now_ms):
+    if now_ms >= next_bar_due(interval, mark["checked_at"]):
+        return True
+    return market_open() and now_ms - mark["checked_at"] >= WATERMARK_REFRESH * 1000
+
+
+def series_version(exchange, token, interval, now_ms=None):
+    """(last_bar, checked_at) of a series while no newer bar can be fetched, else None.
+
+    The pair only moves when the broker is asked again, so anything computed
+    from the series stays valid for as long as this value is unchanged.
+    """
+    if interval in RESAMPLED:
+        interval = BASE_INTERVAL
+    mark = store.watermark(exchange.upper(), str(token), interval)
+    now_ms = now_ms or int(time.time() * 1000)
+    if mark is None or _needs_refresh(mark, interval, now_ms):
+        return None
+    return mark["last_bar"], mark["checked_at"]
+
+
+def _chunks(kind, start, end, interval):
+    step = MAX_DAYS_PER_REQUEST.get(interval, 30) * 86_400_000
+    return [(kind, s, min(s + step - 1, end)) for s in range(start, end + 1, step)]
+
+
+def _plan(key, from_ms, to_ms, now_ms):
+    """Decide which ranges need the broker: ("history", start, end) and/or ("forward", since, end)."""
+    mark = store.watermark(*key)
+    ranges = []
+
+    # Backfill history older than anything fetched so far
+    coverage = store.coverage(*key)
+    history_end = to_ms if mark is None or not coverage else min(to_ms, coverage[0][0] - 1)
+    for start, end in store.missing_ranges(*key, from_ms, history_end):
+        ranges += _chunks("history", start, end, key[2])
+
+    # Forward: only the bars from the watermark on, and only once a new one can exist
+    if mark is not None and to_ms > mark["checked_at"] and _needs_refresh(mark, key[2], now_ms):
+        ranges += _chunks("forward", mark["last_bar"] or mark["checked_at"], to_ms, key[2])
+    return mark, ranges
+
+
+def _apply(key, from_ms, to_ms, now_ms, mark, fetched, on_fetch):
+    """Persist fetched rows, advance the watermark and return the requested slice."""
+    cached = _series.get(key)
+    # Another process (the scan worker, the other app) may have moved the series on disk
+    reload = cached is None or cached["start"] > from_ms or cached["mark"] != mark
+
+    for kind, start, end, rows in fetched:
+        if rows is None:
+            continue
+        _store_rows(key, start, end, rows, on_fetch)
+        if kind == "history":
+            reload = True
+            if mark is None:
+                last = store.read_table(*key, start=from_ms)["time"]
+                mark = {"last_bar": last[-1].as_py() if len(last) else None, "checked_at": now_ms}
+                store.set_watermark(*key, mark["last_bar"], mark["checked_at"])
+            continue
+
+        if len(rows) and not reload:
+            cached["bars"] = cached["bars"].merge(rows)
+        last_bar = int(rows.time[-1]) if len(rows) else mark["last_bar"]
+        store.set_watermark(*key, last_bar, now_ms)
+        mark = {"last_bar": last_bar, "checked_at": now_ms}
+
+    if reload:
+        cached = {"start": from_ms, "bars": CandleSeries.from_table(store.read_table(*key, start=from_ms))}
+        _series[key] = cached
+    cached["mark"] = mark
+    return cached["bars"].between(from_ms, to_ms)
+
+
+def _plan_locked(key, from_ms, to_ms, now_ms):
+    with _lock(key):
+        return _plan(key, from_ms, to_ms, now_ms)
+
+
+def _apply_locked(key, from_ms, to_ms, now_ms, mark, fetched, on_fetch):
+    with _lock(key):
+        return _apply(key, from_ms, to_ms, now_ms, mark, fetched, on_fetch)
+
+
+def _resample(exchange, token, interval, base, from_ms, to_ms):
+    key = (exchange.upper(), str(token), interval)
+    with _lock(key):
+        series = _resampled.get(key)
+        if series is None:
+            series = _resampled[key] = Resampled(interval)
+        series.update(base)
+        return series.slice(from_ms, to_ms)
+
+
+def load_candles(exchange, token, from_dt, to_dt, interval, on_fetch=None):
+    """Candles in [from_dt, to_dt], touching the broker only for bars it has not returned yet.
+
+    Intervals in RESAMPLED are built from BASE_INTERVAL bars, the only intraday
+    interval that is fetched and stored. on_fetch, if given, is called with
+    the CandleSeries that came from the broker. The series lock is held
+    while planning and merging but not across the broker calls, so a scan
+    waiting on the rate limiter does not block other loads of the same
+    series; a concurrent load at worst fetches the same bars twice, and
+    merging them again is harmless.
+    """
+    if interval in RESAMPLED:
+        base = load_candles(exchange, token, from_dt, to_dt, BASE_INTERVAL, on_fetch)
+        return _resample(exchange, token, interval, base, to_millis(from_dt), to_millis(to_dt))
+    key = (exchange.upper(), str(token), interval)
+    from_ms, to_ms = to_millis(from_dt), to_millis(to_dt)
+    now_ms = int(time.time() * 1000)
+
+    mark, ranges = _plan_locked(key, from_ms, to_ms, now_ms)
+    fetched = [(kind, start, end, fetch_candles(exchange, token, _local(start), _local(end), interval))
+               for kind, start, end in ranges]
+    return _apply_locked(key, from_ms, to_ms, now_ms, mark, fetched, on_fetch)
+
+
+async def load_candles_async(exchange, token, from_dt, to_dt, interval, fetch, on_fetch=None):
+    """load_candles with the broker calls made by an async `fetch` coroutine.
+
+    fetch(exchange, token, from_dt, to_dt, interval) must return a CandleSeries
+    or None like fetch_candles. Planning, merging and resampling take the
+    series lock and touch the Parquet store, so they run on a worker thread
+    and never block the event loop behind a sync load of the same series.
+    """
+    if interval in RESAMPLED:
+        base = await load_candles_async(exchange, token, from_dt, to_dt, BASE_INTERVAL, fetch, on_fetch)
+        return await asyncio.to_thread(_resample, exchange, token, interval, base,
+                                       to_millis(from_dt), to_millis(to_dt))
+    key = (exchange.upper(), str(token), interval)
+    from_ms, to_ms = to_millis(from_dt), to_millis(to_dt)
+    now_ms = int(time.time() * 1000)
+
+    mark, ranges = await asyncio.to_thread(_plan_locked, key, from_ms, to_ms, now_ms)
+    fetched = []
+    for kind, start, end in ranges:
+        fetched.append((kind, start, end, await fetch(exchange, token, _local(start), _local(end), interval)))
+    return await asyncio.to_thread(_apply_locked, key, from_ms, to_ms, now_ms, mark, fetched, on_fetch)
@@ -0,0 +1,155 @@
+"""Columnar OHLCV series for one symbol.
+
+A CandleSeries holds its bars as parallel NumPy columns: int64 epoch-ms time
+and float64 open/high/low/close/volume, sorted by time with one bar per
+timestamp. It is what the broker parser, the store reader, the loader cache,
+resampling and the pattern detectors pass around, so a series is never
+rebuilt as one dict per bar on the way from fetch to response.
+
+Series are treated as immutable: slicing returns views and merging builds new
+columns, so a slice handed to a scan stays valid while the loader moves the
+cached series on. For code written against candle dict lists, indexing with
+an int returns the candle dict (SmartAPI style time string) and iterating
+yields them.
+
+Responses can be encoded as rows (the original [{time, open, ...}] list),
+compact columns ({"time": [...], "open": [...], ...}) or an Arrow IPC stream.
+"""
+import json
+import numpy as np
+import pyarrow as pa
+
+from candle_store import SCHEMA, COLUMNS, to_millis, format_time
+
+FIELDS = ("time",) + COLUMNS
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+class CandleSeries:
+
+    __slots__ = FIELDS
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = np.asarray(time, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), *(np.empty(0) for _ in COLUMNS))
+
+    @classmethod
+    def from_broker(cls, data):
+        """getCandleData rows ([time, open, high, low, close, volume]) -> series sorted by time."""
+        if not data:
+            return cls.empty()
+        values = np.array([r[1:6] for r in data], dtype=np.float64).reshape(len(data), 5)
+        return cls(np.fromiter((to_millis(r[0]) for r in data), np.int64, len(data)), *values.T).normalized()
+
+    @classmethod
+    def from_candles(cls, candles):
+        """Candle dicts (any time form to_millis accepts) -> series sorted by time."""
+        if isinstance(candles, cls):
+            return candles
+        return cls(np.fromiter((to_millis(c["time"]) for c in candles), np.int64, len(candles)),
+                   *(np.fromiter((c[k] for c in candles), np.float64, len(candles)) for k in COLUMNS)).normalized()
+
+    @classmethod
+    def from_table(cls, table):
+        """Arrow table with the store's SCHEMA (already sorted and deduplicated)."""
+        return cls(*(table.column(k).to_numpy() for k in FIELDS))
+
+    def columns(self):
+        return self.time, self.open, self.high, self.low, self.close, self.volume
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CandleSeries(*(col[index] for col in self.columns()))
+        return {"time": format_time(int(self.time[index])), "open": float(self.open[index]),
+                "high": float(self.high[index]), "low": float(self.low[index]),
+                "close": float(self.close[index]), "volume": float(self.volume[index])}
+
+    def __iter__(self):
+        return iter(self.to_candles())
+
+    def normalized(self):
+        """Sorted by time, keeping the last of any duplicate timestamps."""
+        t = self.time
+        if len(t) < 2 or (t[1:] > t[:-1]).all():
+            return self
+        order = np.argsort(t, kind="stable")
+        t = t[order]
+        keep = order[np.r_[t[1:] != t[:-1], True]]
+        return CandleSeries(*(col[keep] for col in self.columns()))
+
+    def between(self, from_ms, to_ms):
+        """Bars with from_ms <= time <= to_ms, as a view."""
+        lo = np.searchsorted(self.time, from_ms, "left")
+        hi = np.searchsorted(self.time, to_ms, "right")
+        return self[lo:hi]
+
+    def downsample(self, points):
+        """At most `points` bars, merging runs of consecutive bars into one OHLCV bar.
+
+        Runs are counted back from the latest bar, so it stays the last bar of
+        the last run; each merged bar keeps the time of its first bar.
+        """
+        n = len(self)
+        if points <= 0 or n <= points:
+            return self
+        step = -(-n // points)
+        first = np.maximum(n - step * np.arange(-(-n // step), 0, -1), 0)
+        last = np.r_[first[1:] - 1, n - 1]
+        return CandleSeries(self.time[first], self.open[first], np.maximum.reduceat(self.high, first),
+                            np.minimum.reduceat(self.low, first), self.close[last],
+                            np.add.reduceat(self.volume, first))
+
+    def merge(self, newer):
+        """This series up to newer's first bar, followed by newer."""
+        if not len(newer):
+            return self
+        cut = np.searchsorted(self.time, newer.time[0], "left")
+        return self.concat(self[:cut], newer)
+
+    @staticmethod
+    def concat(*parts):
+        return CandleSeries(*(np.concatenate(cols) for cols in zip(*(p.columns() for p in parts))))
+
+    # ---------------- encodings ----------------
+    def to_candles(self):
+        """Candle dicts as SmartAPI-era code expects them (time as an IST ISO string)."""
+        return [{"time": format_time(t), "open": o, "high": h, "low": l, "close": c, "volume": v}
+                for t, o, h, l, c, v in zip(*(col.tolist() for col in self.columns()))]
+
+    def to_rows(self, fields=FIELDS[:5]):
+        """[{time: epoch ms, open, ...}] - the /api/candles row format."""
+        cols = [getattr(self, k).tolist() for k in fields]
+        return [dict(zip(fields, values)) for values in zip(*cols)]
+
+    def to_columns(self, fields=FIELDS):
+        """{"time": [...], "open": [...], ...} with epoch-ms times."""
+        return {k: getattr(self, k).tolist() for k in fields}
+
+    def to_json(self, fields=FIELDS):
+        return json.dumps(self.to_columns(fields), separators=(",", ":"))
+
+    def to_table(self):
+        return pa.table({k: getattr(self, k) for k in FIELDS}, schema=SCHEMA)
+
+    def to_arrow(self):
+        """Arrow IPC stream bytes (ARROW_MIMETYPE) of the store's SCHEMA."""
+        return arrow_stream(self.to_table())
+
+
+def arrow_stream(table):
+    """Arrow IPC stream bytes for any table."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,241 @@
+"""Append-only, per-symbol Parquet store for OHLCV candles.
+
+Each (exchange, symbol_token, interval) series lives in its own directory:
+
+    <CANDLE_STORE_DIR>/<exchange>/<token>/<interval>/part-*.parquet
+                                                    /coverage.json
+
+Parts are only ever added and are named by write time, so when two parts hold
+the same timestamp the later one wins on read. coverage.json records which time
+ranges have been fetched from the broker (weekends and holidays have no bars,
+so the bars alone cannot tell a gap from a closed market) and drives
+missing_ranges().
+All timestamps are epoch milliseconds.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import datetime as dt
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "candles"))
+COMPACT_AFTER_PARTS = int(os.getenv("CANDLE_STORE_COMPACT_AFTER", "32"))
+
+IST = dt.timezone(dt.timedelta(hours=5, minutes=30))
+MARKET_OPEN = dt.time(9, 15)
+MARKET_CLOSE = dt.time(15, 30)
+INTERVAL_SECONDS = {
+    "ONE_MINUTE": 60, "THREE_MINUTE": 180, "FIVE_MINUTE": 300, "TEN_MINUTE": 600,
+    "FIFTEEN_MINUTE": 900, "THIRTY_MINUTE": 1800, "ONE_HOUR": 3600,
+}
+COLUMNS = ("open", "high", "low", "close", "volume")
+SCHEMA = pa.schema([("time", pa.int64())] + [(c, pa.float64()) for c in COLUMNS])
+
+
+def to_millis(value):
+    """Epoch ms from a datetime, SmartAPI time string or number."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = dt.datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def format_time(millis):
+    """Epoch ms -> SmartAPI style '2025-08-18T00:00:00+05:30'."""
+    return dt.datetime.fromtimestamp(millis / 1000, IST).isoformat()
+
+
+def settled_until(interval, now=None):
+    """Latest epoch ms whose bars can no longer change.
+
+    Today's daily bar keeps moving until the NSE close, so coverage for a
+    fetch made during the session must stop at midnight.
+    """
+    now = (now or dt.datetime.now(IST)).astimezone(IST)
+    if interval == "ONE_DAY" and now.time() < MARKET_CLOSE:
+        now = dt.datetime.combine(now.date(), dt.time(0), IST) - dt.timedelta(milliseconds=1)
+    return to_millis(now)
+
+
+def market_open(now=None):
+    now = (now or dt.datetime.now(IST)).astimezone(IST)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_bar_due(interval, after_ms):
+    """Epoch ms at which the first bar closing after `after_ms` is complete."""
+    if interval in INTERVAL_SECONDS:
+        step = INTERVAL_SECONDS[interval] * 1000
+        return (after_ms // step + 1) * step
+    after = dt.datetime.fromtimestamp(after_ms / 1000, IST)
+    due = dt.datetime.combine(after.date(), MARKET_CLOSE, IST)
+    while due <= after or due.weekday() >= 5:
+        due = dt.datetime.combine(due.date() + dt.timedelta(days=1), MARKET_CLOSE, IST)
+    return to_millis(due)
+
+
+def merge_ranges(ranges):
+    out = []
+    for start, end in sorted(ranges):
+        if out and start <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return out
+
+
+def subtract_ranges(start, end, covered):
+    """Parts of [start, end] not inside any covered range."""
+    gaps = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start - 1))
+        cursor = max(cursor, c_end + 1)
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class CandleStore:
+
+    def __init__(self, root=CANDLE_STORE_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _dir(self, exchange, token, interval):
+        return os.path.join(self.root, str(exchange).upper(), str(token), str(interval))
+
+    def _lock(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _parts(self, path):
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".parquet"))
+
+    def series(self, interval):
+        """(exchange, token) of every stored series for `interval`."""
+        if not os.path.isdir(self.root):
+            return []
+        return [(exchange, token)
+                for exchange in sorted(os.listdir(self.root))
+                for token in sorted(os.listdir(os.path.join(self.root, exchange)))
+                if os.path.isdir(os.path.join(self.root, exchange, token, interval))]
+
+    def coverage(self, exchange, token, interval):
+        path = os.path.join(self._dir(exchange, token, interval), "coverage.json")
+        try:
+            with open(path) as f:
+                return [tuple(r) for r in json.load(f)]
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def _write_coverage(self, path, ranges):
+        tmp = os.path.join(path, f".coverage-{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(ranges, f)
+        os.replace(tmp, os.path.join(path, "coverage.json"))
+
+    def watermark(self, exchange, token, interval):
+        """{"last_bar": ms or None, "checked_at": ms} of the latest forward fetch, or None."""
+        path = os.path.join(self._dir(exchange, token, interval), "watermark.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_watermark(self, exchange, token, interval, last_bar, checked_at):
+        path = self._dir(exchange, token, interval)
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, f".watermark-{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"last_bar": last_bar, "checked_at": checked_at}, f)
+        os.replace(tmp, os.path.join(path, "watermark.json"))
+
+    def missing_ranges(self, exchange, token, interval, start, end):
+        """(start_ms, end_ms) ranges inside [start, end] that were never fetched."""
+        start, end = to_millis(start), to_millis(end)
+        return subtract_ranges(start, end, self.coverage(exchange, token, interval))
+
+    def append(self, exchange, token, interval, candles, covered=None):
+        """Add bars (a CandleSeries or candle dicts) as a new part and mark the range `covered` as fetched."""
+        path = self._dir(exchange, token, interval)
+        with self._lock(path):
+            os.makedirs(path, exist_ok=True)
+            if len(candles):
+                if hasattr(candles, "to_table"):
+                    table = candles.to_table()
+                else:
+                    table = pa.table({
+                        "time": pa.array([to_millis(c["time"]) for c in candles], pa.int64()),
+                        **{k: pa.array([float(c[k]) for c in candles], pa.float64()) for k in COLUMNS}
+                    }, schema=SCHEMA)
+                _write_part(path, table)
+            if covered:
+                ranges = self.coverage(exchange, token, interval) + [tuple(to_millis(v) for v in covered)]
+                self._write_coverage(path, merge_ranges(ranges))
+            if len(self._parts(path)) > COMPACT_AFTER_PARTS:
+                self._compact(path)
+
+    def read_table(self, exchange, token, interval, start=None, end=None):
+        """Bars in [start, end] as an Arrow table sorted by time, one row per timestamp."""
+        path = self._dir(exchange, token, interval)
+        filters = []
+        if start is not None:
+            filters.append(("time", ">=", to_millis(start)))
+        if end is not None:
+            filters.append(("time", "<=", to_millis(end)))
+        with self._lock(path):
+            parts = self._parts(path)
+            if not parts:
+                return SCHEMA.empty_table()
+            table = pa.concat_tables(
+                pq.read_table(p, schema=SCHEMA, filters=filters or None) for p in parts
+            )
+        return _dedupe(table)
+
+    def read(self, exchange, token, interval, start=None, end=None):
+        """Same rows as read_table, as a list of candle dicts; get_candles uses CandleSeries instead."""
+        cols = self.read_table(exchange, token, interval, start, end).to_pydict()
+        return [{"time": format_time(t), "open": o, "high": h, "low": l, "close": c, "volume": v}
+                for t, o, h, l, c, v in zip(cols["time"], cols["open"], cols["high"],
+                                            cols["low"], cols["close"], cols["volume"])]
+
+    def _compact(self, path):
+        parts = self._parts(path)
+        _write_part(path, _dedupe(pa.concat_tables(pq.read_table(p, schema=SCHEMA) for p in parts)))
+        for p in parts:
+            os.remove(p)
+
+
+def _write_part(path, table):
+    pq.write_table(table, os.path.join(path, f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"))
+
+
+def _dedupe(table):
+    """Sort by time and keep the last-written row for each timestamp."""
+    if table.num_rows == 0:
+        return table
+    table = table.append_column("_seq", pa.array(range(table.num_rows), pa.int64()))
+    table = table.sort_by([("time", "ascending"), ("_seq", "descending")])
+    times = table["time"].to_numpy()
+    keep = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+    return table.take(keep).drop_columns(["_seq"])
+
+
+store = CandleStore()
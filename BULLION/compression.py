@@ -0,0 +1,86 @@
+"""Content-negotiated response compression for the Flask apps.
+
+`install(app)` compresses finished responses with brotli or gzip, whichever
+the client's Accept-Encoding prefers (brotli wins ties). Small bodies,
+streamed responses (the NDJSON scans) and responses that already carry a
+Content-Encoding are left alone. brotli is optional; without the package
+only gzip is offered.
+
+A compressed body is no longer byte-for-byte the one the strong ETag named,
+so its ETag is made weak; If-None-Match uses the weak comparison, and a 304
+answering a weak tag hands the weak tag back.
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))   # 11 is far too slow per request
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_encoding(accept_encoding):
+    """Best supported coding for an Accept-Encoding header, or None for identity."""
+    q = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name] = weight
+    best, best_q = None, 0.0
+    for coding in available_encodings():
+        weight = q.get(coding, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = coding, weight
+    return best
+
+
+def compress(data, coding):
+    if coding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+
+def install(app):
+    from flask import request
+
+    @app.after_request
+    def _compress(resp):
+        if resp.status_code == 304:
+            resp.vary.add("Accept-Encoding")
+            etag, weak = resp.get_etag()
+            if etag and not weak and request.if_none_match.is_weak(etag):
+                resp.set_etag(etag, weak=True)
+            return resp
+        if (resp.direct_passthrough or resp.is_streamed or resp.status_code == 204
+                or "Content-Encoding" in resp.headers):
+            return resp
+        resp.vary.add("Accept-Encoding")
+        data = resp.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return resp
+        coding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if coding is None:
+            return resp
+        resp.set_data(compress(data, coding))
+        resp.headers["Content-Encoding"] = coding
+        etag, weak = resp.get_etag()
+        if etag and not weak:
+            resp.set_etag(etag, weak=True)
+        return resp
@@ -0,0 +1,270 @@
+"""A local stand-in for the SmartAPI REST endpoints the apps use.
+
+Serves login/profile, getCandleData, searchScrip, getLtpData and a scrip
+master over HTTP, so SmartConnect, the async broker and the instrument index
+run their real code paths against it (point SMART_API_ROOT and
+SCRIP_MASTER_URL here). Candles are synthetic but deterministic per token and
+bar time, so repeated and overlapping requests agree. Each response can be
+delayed, requests over a per-endpoint rate are rejected the way SmartAPI
+rejects them (403, plain-text "exceeding access rate"), and a fraction of
+calls can fail with a generic or an expired-token error. Every request is
+counted per endpoint.
+
+    python fake_smartapi.py --port 8700 --latency-ms 30 --rate getCandleData=3
+"""
+import os
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import datetime as dt
+import numpy as np
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from candle_store import IST, INTERVAL_SECONDS, MARKET_OPEN, MARKET_CLOSE
+
+ROUTES = {
+    "/rest/auth/angelbroking/user/v1/loginByPassword": "login",
+    "/rest/secure/angelbroking/user/v1/getProfile": "getProfile",
+    "/rest/secure/angelbroking/historical/v1/getCandleData": "getCandleData",
+    "/rest/secure/angelbroking/order/v1/searchScrip": "searchScrip",
+    "/rest/secure/angelbroking/order/v1/getLtpData": "ltpData",
+}
+# SmartAPI's documented per-second limits
+DEFAULT_RATES = {"login": 1.0, "getCandleData": 3.0, "searchScrip": 1.0, "ltpData": 10.0}
+FAKE_SYMBOLS = int(os.getenv("FAKE_SMARTAPI_SYMBOLS", "20000"))
+TOKEN_BASE = 100000
+SESSION_SECONDS = 8 * 3600
+
+
+def symbol_name(i):
+    return f"BENCH{i:05d}"
+
+
+def _noise(x):
+    """Deterministic uniform [0, 1) values from float inputs."""
+    return np.modf(np.abs(np.sin(x) * 43758.5453))[0]
+
+
+def synthetic_candles(token, times):
+    """OHLCV rows for one token at the given epoch-second bar starts."""
+    t = np.asarray(times, dtype=np.float64)
+    seed = float(token) % 9973
+    days = t / 86400.0
+    close = (50 + seed % 950) * (1 + 0.08 * np.sin(days / 9 + seed) + 0.03 * np.sin(days / 2.3 + 2 * seed))
+    u1, u2, u3, u4 = (_noise(t * 1e-5 + seed * k) for k in (1.1, 2.3, 3.7, 5.3))
+    open_ = close * (1 + 0.01 * (u1 - 0.5))
+    high = np.maximum(open_, close) * (1 + 0.02 * u2)
+    low = np.minimum(open_, close) * (1 - 0.008 * u3)
+    volume = np.floor(1000 + 99000 * u4)
+    return open_.round(2), high.round(2), low.round(2), close.round(2), volume
+
+
+def bar_starts(interval, from_dt, to_dt, now=None):
+    """Epoch seconds of every finished-or-forming bar between two IST wall times."""
+    now = now or dt.datetime.now(IST)
+    step = INTERVAL_SECONDS.get(interval, 86400)
+    out = []
+    day = from_dt.date()
+    while day <= to_dt.date():
+        if day.weekday() < 5:
+            if interval == "ONE_DAY":
+                starts = [dt.datetime.combine(day, dt.time(0, 0), IST)]
+            else:
+                opening = dt.datetime.combine(day, MARKET_OPEN, IST)
+                n = int((dt.datetime.combine(day, MARKET_CLOSE, IST) - opening).total_seconds() // step) + 1
+                starts = [opening + dt.timedelta(seconds=step * k) for k in range(n)]
+                closing = dt.datetime.combine(day, MARKET_CLOSE, IST)
+                starts = [s for s in starts if s < closing]
+            out.extend(int(s.timestamp()) for s in starts
+                       if from_dt.replace(tzinfo=IST) <= s <= to_dt.replace(tzinfo=IST) and s <= now)
+        day += dt.timedelta(days=1)
+    return out
+
+
+def _jwt(client_code, expires_at):
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'none'})}.{part({'sub': client_code, 'exp': int(expires_at)})}.fake"
+
+
+class _Quota:
+    """Requests-per-second allowance for one endpoint (token bucket, burst of one second)."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class FakeSmartAPI:
+
+    def __init__(self, latency_ms=20.0, jitter_ms=5.0, rates=None, error_rate=0.0, auth_error_rate=0.0,
+                 symbols=FAKE_SYMBOLS, seed=7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.error_rate = error_rate
+        self.auth_error_rate = auth_error_rate
+        self.symbols = symbols
+        self._random = random.Random(seed)
+        self._quotas = {name: _Quota(rate) for name, rate in self.rates.items() if rate}
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_stats()
+        self.app = self._build_app()
+
+    # ---------------- bookkeeping ----------------
+    def reset_stats(self):
+        with self._lock:
+            self.counts = {name: {"requests": 0, "throttled": 0, "errors": 0, "auth_errors": 0}
+                           for name in set(ROUTES.values()) | {"scripMaster"}}
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(c) for name, c in self.counts.items()}
+
+    def _count(self, name, field):
+        with self._lock:
+            self.counts[name][field] += 1
+
+    def _roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    # ---------------- HTTP ----------------
+    def _build_app(self):
+        app = Flask("fake_smartapi")
+
+        @app.route("/scrip_master.json")
+        def scrip_master():
+            self._count("scripMaster", "requests")
+            return jsonify([{"token": str(TOKEN_BASE + i), "symbol": f"{symbol_name(i)}-EQ",
+                             "name": symbol_name(i), "exch_seg": "NSE"} for i in range(self.symbols)])
+
+        for path, name in ROUTES.items():
+            app.add_url_rule(path, name, self._endpoint(name), methods=["GET", "POST"])
+        return app
+
+    def _endpoint(self, name):
+        handler = getattr(self, f"_{name}")
+
+        def view():
+            self._count(name, "requests")
+            if self.latency_ms or self.jitter_ms:
+                with self._lock:
+                    delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms))
+                time.sleep(delay / 1000.0)
+            quota = self._quotas.get(name)
+            if quota and not quota.take():
+                self._count(name, "throttled")
+                return Response("Access denied because of exceeding access rate", status=403,
+                                mimetype="text/plain")
+            if name != "login" and self._roll(self.auth_error_rate):
+                self._count(name, "auth_errors")
+                return jsonify({"status": False, "message": "Invalid Token", "errorcode": "AG8001", "data": None})
+            if self._roll(self.error_rate):
+                self._count(name, "errors")
+                return jsonify({"status": False, "message": "Something Went Wrong, Please Try After Sometime",
+                                "errorcode": "AB1004", "data": None})
+            return jsonify({"status": True, "message": "SUCCESS", "errorcode": "",
+                            "data": handler(request.get_json(force=True, silent=True) or {})})
+        return view
+
+    def _login(self, body):
+        client = body.get("clientcode") or "BENCH"
+        return {"jwtToken": _jwt(client, time.time() + SESSION_SECONDS),
+                "refreshToken": "fake-refresh", "feedToken": "fake-feed"}
+
+    def _getProfile(self, body):
+        return {"clientcode": "BENCH", "name": "Benchmark", "exchanges": ["NSE"]}
+
+    def _getCandleData(self, body):
+        fmt = "%Y-%m-%d %H:%M"
+        times = bar_starts(body.get("interval", "ONE_DAY"),
+                           dt.datetime.strptime(body["fromdate"], fmt), dt.datetime.strptime(body["todate"], fmt))
+        if not times:
+            return []
+        o, h, l, c, v = synthetic_candles(body["symboltoken"], times)
+        return [[dt.datetime.fromtimestamp(t, IST).isoformat(), *row]
+                for t, row in zip(times, zip(o.tolist(), h.tolist(), l.tolist(), c.tolist(), v.tolist()))]
+
+    def _searchScrip(self, body):
+        query = (body.get("searchscrip") or "").upper()
+        return [{"exchange": "NSE", "tradingsymbol": f"{symbol_name(i)}-EQ", "symboltoken": str(TOKEN_BASE + i)}
+                for i in range(self.symbols) if symbol_name(i).startswith(query.split("-")[0])][:50]
+
+    def _ltpData(self, body):
+        now = int(time.time())
+        o, h, l, c, _ = synthetic_candles(body.get("symboltoken") or 0, [now - now % 86400 - 86400, now])
+        return {"exchange": body.get("exchange"), "tradingsymbol": body.get("tradingsymbol"),
+                "symboltoken": body.get("symboltoken"), "open": float(o[1]), "high": float(h[1]),
+                "low": float(l[1]), "close": float(c[0]), "ltp": float(c[1])}
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve on a daemon thread; returns the root URL."""
+        self._server = make_server(host, port, self.app, threaded=True, request_handler=_QuietHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-smartapi").start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _rates(items):
+    """['getCandleData=3', ...] -> {'getCandleData': 3.0}"""
+    rates = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        rates[name] = float(value)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake SmartAPI server with synthetic market data.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--rate", action="append", help="per-endpoint limit, e.g. getCandleData=3 (0 disables)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--auth-error-rate", type=float, default=0.0)
+    parser.add_argument("--symbols", type=int, default=FAKE_SYMBOLS)
+    args = parser.parse_args()
+
+    fake = FakeSmartAPI(args.latency_ms, args.jitter_ms, _rates(args.rate), args.error_rate,
+                        args.auth_error_rate, args.symbols)
+    root = fake.start(args.host, args.port)
+    print(f"Fake SmartAPI on {root} (SMART_API_ROOT={root} SCRIP_MASTER_URL={root}/scrip_master.json)")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(fake.stats()))
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Incremental indicator state for live bars.
+
+Each indicator keeps only the rolling state it needs per symbol: the last
+close, a rising-close streak, EMA values, Wilder's averages. The state lives in
+NumPy arrays with one row per symbol. Committing a closed bar is an O(1)
+scalar update of one row, and nothing re-reads candle history after seeding.
+
+A LiveBars block also holds each symbol's forming bar, updated tick by tick.
+`peek` methods evaluate an indicator as if the forming bar closed now, from
+the committed state plus the forming close, for every row at once. A live
+scan re-evaluates thousands of symbols per tick with a few array operations.
+Committed values match the batch functions in patterns.py for the same
+history (EMA and MACD exactly, RSI to float rounding).
+"""
+import time
+import numpy as np
+
+from candle_store import INTERVAL_SECONDS, to_millis
+from candle_series import CandleSeries
+from resample import DAY_MS, IST_OFFSET_MS, OPEN_MS
+from pattern_engine import (shooting_star_mask, level_arrays, TREND_BARS, MIN_BARS,
+                            UPPER_SHADOW_RATIO, LOWER_SHADOW_RATIO)
+from patterns import RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL
+
+INITIAL_CAPACITY = 1024
+
+
+def _grown(arr, capacity, fill):
+    out = np.full(capacity, fill, dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+class RowState:
+    """Per-symbol NumPy arrays named in FILLS, each with the value an empty row holds."""
+
+    __slots__ = ()
+    FILLS = ()
+
+    def parts(self):
+        """Nested RowStates that move with this one."""
+        return ()
+
+    def grow(self, capacity):
+        for name, fill in self.FILLS:
+            setattr(self, name, _grown(getattr(self, name), capacity, fill))
+        for part in self.parts():
+            part.grow(capacity)
+
+    def move(self, src, dst):
+        """Copy row `src` over row `dst`, then empty `src`."""
+        for name, fill in self.FILLS:
+            arr = getattr(self, name)
+            arr[dst] = arr[src]
+            arr[src] = fill
+        for part in self.parts():
+            part.move(src, dst)
+
+
+class Streak(RowState):
+    """Consecutive strictly rising closes ending at the last committed bar."""
+
+    __slots__ = ("last", "run")
+    FILLS = (("last", np.nan), ("run", 0))
+
+    def __init__(self, capacity):
+        self.last = np.full(capacity, np.nan)
+        self.run = np.zeros(capacity, dtype=np.int64)
+
+    def push(self, row, close):
+        self.run[row] = self.run[row] + 1 if close > self.last[row] else 0
+        self.last[row] = close
+
+    def peek(self, rows, close):
+        with np.errstate(invalid="ignore"):
+            return np.where(close > self.last[rows], self.run[rows] + 1, 0)
+
+
+class EMA(RowState):
+    """Exponential moving average seeded with the first value, as patterns.ema."""
+
+    __slots__ = ("period", "alpha", "value", "count")
+    FILLS = (("value", np.nan), ("count", 0))
+
+    def __init__(self, capacity, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = np.full(capacity, np.nan)
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def push(self, row, x):
+        self.value[row] = x if self.count[row] == 0 else self.alpha * x + (1 - self.alpha) * self.value[row]
+        self.count[row] += 1
+
+    def peek(self, rows, x):
+        return np.where(self.count[rows] == 0, x, self.alpha * x + (1 - self.alpha) * self.value[rows])
+
+
+class RSI(RowState):
+    """Wilder's RSI: simple average of the first `period` moves, then smoothed (as patterns.rsi)."""
+
+    __slots__ = ("period", "last", "gain", "loss", "moves")
+    FILLS = (("last", np.nan), ("gain", 0.0), ("loss", 0.0), ("moves", 0))
+
+    def __init__(self, capacity, period=RSI_PERIOD):
+        self.period = period
+        self.last = np.full(capacity, np.nan)
+        self.gain = np.zeros(capacity)
+        self.loss = np.zeros(capacity)
+        self.moves = np.zeros(capacity, dtype=np.int64)
+
+    def push(self, row, close):
+        last = self.last[row]
+        self.last[row] = close
+        if last != last:        # first bar
+            return
+        delta = close - last
+        g, l = max(delta, 0.0), max(-delta, 0.0)
+        n = self.moves[row] + 1
+        self.moves[row] = n
+        p = self.period
+        if n < p:
+            self.gain[row] += g
+            self.loss[row] += l
+        elif n == p:
+            self.gain[row] = (self.gain[row] + g) / p
+            self.loss[row] = (self.loss[row] + l) / p
+        else:
+            self.gain[row] = (self.gain[row] * (p - 1) + g) / p
+            self.loss[row] = (self.loss[row] * (p - 1) + l) / p
+
+    @staticmethod
+    def _value(gain, loss):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+
+    def current(self, rows):
+        """RSI at the last committed bar (NaN until `period` moves are in)."""
+        return np.where(self.moves[rows] >= self.period, self._value(self.gain[rows], self.loss[rows]), np.nan)
+
+    def peek(self, rows, close):
+        p = self.period
+        delta = close - self.last[rows]
+        g, l = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+        n = self.moves[rows] + 1
+        seeded = n == p
+        gain = np.where(seeded, (self.gain[rows] + g) / p, (self.gain[rows] * (p - 1) + g) / p)
+        loss = np.where(seeded, (self.loss[rows] + l) / p, (self.loss[rows] * (p - 1) + l) / p)
+        return np.where(n >= p, self._value(gain, loss), np.nan)
+
+
+class MACD(RowState):
+    """MACD line, signal line and the previous histogram value for cross detection."""
+
+    __slots__ = ("fast", "slow", "signal", "hist")
+    FILLS = (("hist", np.nan),)
+
+    def __init__(self, capacity, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+        self.fast = EMA(capacity, fast)
+        self.slow = EMA(capacity, slow)
+        self.signal = EMA(capacity, signal)
+        self.hist = np.full(capacity, np.nan)
+
+    def parts(self):
+        return self.fast, self.slow, self.signal
+
+    def push(self, row, close):
+        self.fast.push(row, close)
+        self.slow.push(row, close)
+        line = self.fast.value[row] - self.slow.value[row]
+        self.signal.push(row, line)
+        self.hist[row] = line - self.signal.value[row]
+
+    def peek(self, rows, close):
+        """(line, signal line, histogram, previous histogram) if the forming bar closed at `close`."""
+        line = self.fast.peek(rows, close) - self.slow.peek(rows, close)
+        signal = self.signal.peek(rows, line)
+        return line, signal, line - signal, self.hist[rows]
+
+
+class LiveBars(RowState):
+    """Committed indicator state plus the forming bar for many symbols, one array row each."""
+
+    __slots__ = ("interval", "step", "rows", "tokens", "size", "capacity", "bars",
+                 "bar_time", "open", "high", "low", "close", "streak", "rsi", "macd")
+    FILLS = (("bars", 0), ("bar_time", -1), ("open", np.nan), ("high", np.nan), ("low", np.nan), ("close", np.nan))
+
+    def __init__(self, interval="ONE_DAY", capacity=INITIAL_CAPACITY):
+        self.interval = interval
+        self.step = INTERVAL_SECONDS[interval] * 1000 if interval != "ONE_DAY" else None
+        self.rows = {}                  # token -> row
+        self.tokens = []
+        self.size = 0
+        self.capacity = capacity
+        self.bars = np.zeros(capacity, dtype=np.int64)              # committed bars per row
+        self.bar_time = np.full(capacity, -1, dtype=np.int64)       # forming bar start (ms), -1: none
+        self.open, self.high, self.low, self.close = (np.full(capacity, np.nan) for _ in range(4))
+        self.streak = Streak(capacity)
+        self.rsi = RSI(capacity)
+        self.macd = MACD(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def parts(self):
+        return self.streak, self.rsi, self.macd
+
+    def row(self, token):
+        """Row of a token, adding it (and growing the arrays) on first sight."""
+        token = str(token)
+        i = self.rows.get(token)
+        if i is not None:
+            return i
+        if self.size == self.capacity:
+            self.capacity *= 2
+            self.grow(self.capacity)
+        i = self.rows[token] = self.size
+        self.tokens.append(token)
+        self.size += 1
+        return i
+
+    def remove(self, token):
+        """Drop a symbol's row (on unsubscribe); the last row moves into its place."""
+        i = self.rows.pop(str(token), None)
+        if i is None:
+            return
+        last = self.size - 1
+        self.move(last, i)
+        moved = self.tokens.pop()
+        if i != last:
+            self.tokens[i] = moved
+            self.rows[moved] = i
+        self.size = last
+
+    def bar_start(self, ts_ms):
+        """Start of the bar a timestamp falls in: IST midnight for daily bars, else session-anchored."""
+        day = (ts_ms + IST_OFFSET_MS) // DAY_MS * DAY_MS - IST_OFFSET_MS
+        if self.step is None:
+            return day
+        return day + OPEN_MS + (ts_ms - day - OPEN_MS) // self.step * self.step
+
+    def _commit(self, i):
+        close = self.close[i]
+        self.streak.push(i, close)
+        self.rsi.push(i, close)
+        self.macd.push(i, close)
+        self.bars[i] += 1
+        self.bar_time[i] = -1
+
+    def _form(self, i, start, o, h, l, c):
+        self.bar_time[i] = start
+        self.open[i], self.high[i], self.low[i], self.close[i] = o, h, l, c
+
+    def _bar(self, i, start, o, h, l, c):
+        if 0 <= self.bar_time[i] < start:
+            self._commit(i)
+        self._form(i, start, o, h, l, c)
+        self._commit(i)
+
+    def on_bar(self, token, candle):
+        """A finished bar (candle dict). Replaces a forming bar at the same time; an older one is committed first."""
+        self._bar(self.row(token), self.bar_start(to_millis(candle["time"])),
+                  candle["open"], candle["high"], candle["low"], candle["close"])
+
+    def on_tick(self, token, ltp, ts_ms):
+        """Fold a trade price into the forming bar, committing the previous bar when a new one starts."""
+        i = self.rows.get(str(token))
+        if i is None:
+            return
+        start = self.bar_start(ts_ms)
+        forming = self.bar_time[i]
+        if forming == start:
+            if ltp > self.high[i]:
+                self.high[i] = ltp
+            if ltp < self.low[i]:
+                self.low[i] = ltp
+            self.close[i] = ltp
+            return
+        if start < forming:
+            return                      # late tick for a bar already replaced
+        if forming >= 0:
+            self._commit(i)
+        self._form(i, start, ltp, ltp, ltp, ltp)
+
+    def seed(self, token, candles, forming=None):
+        """Replay history once (a CandleSeries or candle dicts). With `forming` the last bar stays
+        open for ticks; by default it does when it is the current bar.
+        """
+        i = self.row(token)
+        series = CandleSeries.from_candles(candles)
+        if not len(series):
+            return i
+        bars = list(zip(self.bar_start(series.time).tolist(), series.open.tolist(), series.high.tolist(),
+                        series.low.tolist(), series.close.tolist()))
+        if forming is None:
+            forming = bars[-1][0] == self.bar_start(int(time.time() * 1000))
+        for bar in bars[:-1] if forming else bars:
+            self._bar(i, *bar)
+        if forming:
+            self._form(i, *bars[-1])
+        return i
+
+    def shooting_star(self, upper_ratio=UPPER_SHADOW_RATIO, lower_ratio=LOWER_SHADOW_RATIO):
+        """Evaluate analyze_candles' rule on every forming bar. Returns length-`size` arrays."""
+        n = self.size
+        forming = self.bar_time[:n] >= 0
+        enough = self.bars[:n] + 1 >= MIN_BARS
+        uptrend = self.streak.run[:n] >= TREND_BARS - 1
+        star = shooting_star_mask(self.open[:n], self.high[:n], self.low[:n], self.close[:n],
+                                  upper_ratio, lower_ratio)
+        eligible = forming & enough & uptrend & star
+        entry, stop, target = level_arrays(self.low[:n], self.high[:n])
+        return {"eligible": eligible, "enough_bars": enough, "uptrend": uptrend, "shooting_star": star,
+                "entry": entry, "stop": stop, "target": target}
+
+    def signals(self):
+        """Shooting Star result dicts for the rows whose forming bar currently qualifies."""
+        tokens = list(self.tokens)      # the feed thread may drop a row while a request reads
+        out = self.shooting_star()
+        return [{"symbol_token": tokens[i], "eligible": True, "pattern": "Shooting Star",
+                 "bar_time": int(self.bar_time[i]),
+                 "entry_sell": round(float(out["entry"][i]), 2), "stop_loss": round(float(out["stop"][i]), 2),
+                 "target": round(float(out["target"][i]), 2)}
+                for i in np.flatnonzero(out["eligible"]) if i < len(tokens)]
+
+    def indicators(self):
+        """RSI and MACD for every row as if each forming bar closed now."""
+        n = self.size
+        rows = np.arange(n)
+        close = self.close[:n]
+        forming = self.bar_time[:n] >= 0
+        line, signal, hist, prev = self.macd.peek(rows, close)
+        # Rows without a forming bar report their committed values
+        committed_line = self.macd.fast.value[:n] - self.macd.slow.value[:n]
+        return {"rsi": np.where(forming, self.rsi.peek(rows, close), self.rsi.current(rows)),
+                "macd": np.where(forming, line, committed_line),
+                "macd_signal": np.where(forming, signal, self.macd.signal.value[:n]),
+                "macd_hist": np.where(forming, hist, self.macd.hist[:n])}
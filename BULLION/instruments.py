@@ -0,0 +1,151 @@
+"""Local index of the SmartAPI instrument master.
+
+The full scrip master is downloaded once a day, trimmed to the four fields we
+use and persisted next to the candle store, so a restart only needs a local
+JSON read. Lookups never touch the broker: exact (exchange, tradingsymbol) ->
+token is a dict hit, name/symbol prefix search is a bisect over a sorted key
+list, and fuzzy matching falls back to difflib over the exchange's names.
+"""
+import os
+import json
+import time
+import bisect
+import difflib
+import threading
+import httpx
+
+SCRIP_MASTER_URL = os.getenv(
+    "SCRIP_MASTER_URL",
+    "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json",
+)
+INSTRUMENTS_FILE = os.getenv(
+    "INSTRUMENTS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "instruments.json"),
+)
+REFRESH_SECONDS = int(os.getenv("INSTRUMENTS_REFRESH_SECONDS", "86400"))
+REFRESH_RETRY_COOLDOWN = float(os.getenv("INSTRUMENTS_RETRY_COOLDOWN", "300"))  # after a failed download
+
+
+class InstrumentIndex:
+    """Compact column lists plus the lookup structures built over them."""
+
+    def __init__(self, rows, fetched_at):
+        # rows: [token, tradingsymbol, name, exchange]
+        self.fetched_at = fetched_at
+        self.tokens = [r[0] for r in rows]
+        self.symbols = [r[1] for r in rows]
+        self.names = [r[2] for r in rows]
+        self.exchanges = [r[3] for r in rows]
+
+        self.by_symbol = {}
+        keys = []
+        names_by_exchange = {}
+        for i, (symbol, name, exchange) in enumerate(zip(self.symbols, self.names, self.exchanges)):
+            self.by_symbol[(exchange, symbol)] = i
+            keys.append((exchange, symbol.upper(), i))
+            if name and name.upper() != symbol.upper():
+                keys.append((exchange, name.upper(), i))
+            names_by_exchange.setdefault(exchange, {}).setdefault(name.upper() or symbol.upper(), i)
+        keys.sort()
+        self.keys = keys
+        self.names_by_exchange = names_by_exchange
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def lookup(self, exchange, tradingsymbol):
+        i = self.by_symbol.get((exchange, tradingsymbol))
+        return self.tokens[i] if i is not None else None
+
+    def _row(self, i):
+        return {"name": self.names[i] or self.symbols[i], "tradingsymbol": self.symbols[i], "symboltoken": self.tokens[i]}
+
+    def search(self, exchange, query, limit=20):
+        """Prefix matches on symbol or name, or close fuzzy matches if there are none."""
+        query = query.strip().upper()
+        seen = []
+        lo = bisect.bisect_left(self.keys, (exchange, query))
+        for ex, key, i in self.keys[lo:]:
+            if ex != exchange or not key.startswith(query):
+                break
+            if i not in seen:
+                seen.append(i)
+                if len(seen) >= limit:
+                    break
+        if not seen:
+            names = self.names_by_exchange.get(exchange, {})
+            for name in difflib.get_close_matches(query, names.keys(), n=limit, cutoff=0.6):
+                seen.append(names[name])
+        return [self._row(i) for i in seen]
+
+
+_index = None
+_lock = threading.Lock()
+_refreshing = False
+_last_failure = 0.0
+
+
+def _load_file():
+    try:
+        with open(INSTRUMENTS_FILE) as f:
+            data = json.load(f)
+        return InstrumentIndex(data["rows"], data["fetched_at"])
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def refresh():
+    """Download the scrip master, persist the trimmed copy and swap the index in."""
+    global _index
+    resp = httpx.get(SCRIP_MASTER_URL, timeout=60)
+    resp.raise_for_status()
+    rows = [[str(r.get("token")), r.get("symbol") or "", r.get("name") or "", r.get("exch_seg") or ""]
+            for r in resp.json()]
+    fetched_at = time.time()
+
+    os.makedirs(os.path.dirname(INSTRUMENTS_FILE), exist_ok=True)
+    tmp = INSTRUMENTS_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": fetched_at, "rows": rows}, f, separators=(",", ":"))
+    os.replace(tmp, INSTRUMENTS_FILE)
+
+    _index = InstrumentIndex(rows, fetched_at)
+    return _index
+
+
+def _refresh_in_background():
+    """Start a download unless one is running or the last one failed within REFRESH_RETRY_COOLDOWN."""
+    global _refreshing
+    with _lock:
+        if _refreshing or time.time() - _last_failure < REFRESH_RETRY_COOLDOWN:
+            return
+        _refreshing = True
+
+    def run():
+        global _refreshing, _last_failure
+        try:
+            refresh()
+        except Exception as e:
+            print("Instrument master refresh error:", e)
+            _last_failure = time.time()
+        finally:
+            _refreshing = False
+
+    threading.Thread(target=run, daemon=True, name="instrument-refresh").start()
+
+
+def get_index():
+    """The current index (None until the first load); schedules a refresh when it is stale."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _load_file()
+    if _index is None or time.time() - _index.fetched_at > REFRESH_SECONDS:
+        _refresh_in_background()
+    return _index
+
+
+def lookup_token(exchange, tradingsymbol):
+    index = get_index()
+    return index.lookup(exchange, tradingsymbol) if index else None
@@ -0,0 +1,250 @@
+"""Live last-price feed backed by the SmartAPI WebSocket (v2 smart-stream).
+
+A LiveFeed runs its source on a background thread with its own event loop
+and writes every tick into an LtpTable. The table is a plain dict of
+immutable (ltp, close, exchange_ts) tuples that only the feed thread writes;
+replacing a dict entry is atomic under the GIL, so request threads read it
+without taking a lock. ReplaySource feeds recorded ticks through the same
+path for tests and local runs without a broker connection.
+"""
+import os
+import json
+import time
+import uuid
+import struct
+import asyncio
+import threading
+import websockets
+from session_manager import session, API_KEY, CLIENT_ID
+
+WS_URL = os.getenv("SMART_WS_URL", "wss://smartapisocket.angelone.in/smart-stream")
+HEARTBEAT_INTERVAL = 10
+RECONNECT_MAX_DELAY = 60
+
+EXCHANGE_TYPES = {"NSE": 1, "NFO": 2, "BSE": 3, "BFO": 4, "MCX": 5, "NCX": 7, "CDS": 13}
+MODE_QUOTE = 2          # LTP + OHLC (gives the previous close)
+SUBSCRIBE, UNSUBSCRIBE = 1, 0
+
+
+def parse_tick(data):
+    """smart-stream binary packet -> (token, ltp, close or None, exchange_ts)."""
+    if len(data) < 51:
+        return None
+    mode = data[0]
+    token = data[2:27].split(b"\x00", 1)[0].decode()
+    exchange_ts = struct.unpack_from("<q", data, 35)[0]
+    ltp = struct.unpack_from("<q", data, 43)[0] / 100
+    close = None
+    if mode >= MODE_QUOTE and len(data) >= 123:
+        close = struct.unpack_from("<q", data, 115)[0] / 100
+    return token, ltp, close, exchange_ts
+
+
+class LtpTable:
+    """token -> (ltp, last_close, exchange_ts), written by the feed thread only."""
+
+    def __init__(self):
+        self._data = {}
+
+    def update(self, token, ltp, close=None, ts=None):
+        if close is None:
+            prev = self._data.get(token)
+            close = prev[1] if prev else None
+        self._data[token] = (ltp, close, ts)
+
+    def get(self, token):
+        return self._data.get(str(token))
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ReplaySource:
+    """Plays back recorded ticks: dicts with token, ltp and optionally close/ts.
+
+    `ticks` may be an iterable or a path to an NDJSON file. With `delay` > 0
+    ticks are spaced out to mimic a live stream. With `hold` the source stays
+    connected after the last tick until the feed is stopped, as a live one
+    would, so later watchlist changes still reach update().
+    """
+
+    def __init__(self, ticks, delay=0.0, hold=False):
+        self.ticks = ticks
+        self.delay = delay
+        self.hold = hold
+
+    def update(self, added, removed):
+        pass
+
+    async def run(self, feed):
+        ticks = self.ticks
+        if isinstance(ticks, str):
+            with open(ticks) as f:
+                ticks = [json.loads(line) for line in f if line.strip()]
+        for tick in ticks:
+            if feed.stopped:
+                return
+            token = str(tick["token"])
+            if token in feed.tokens:
+                feed.on_tick(token, float(tick["ltp"]), tick.get("close"), tick.get("ts"))
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        while self.hold and not feed.stopped:
+            await asyncio.sleep(0.05)
+
+
+class SmartFeedSource:
+    """SmartAPI smart-stream client; resubscribes and reconnects with backoff."""
+
+    def __init__(self, url=WS_URL):
+        self.url = url
+        self.ws = None
+
+    async def _connect(self):
+        headers = {
+            "Authorization": session.jwt_token,
+            "x-api-key": API_KEY,
+            "x-client-code": CLIENT_ID,
+            "x-feed-token": session.feed_token,
+        }
+        try:
+            return await websockets.connect(self.url, additional_headers=headers, ping_interval=None)
+        except TypeError:
+            # websockets < 14 names the argument extra_headers
+            return await websockets.connect(self.url, extra_headers=headers, ping_interval=None)
+
+    async def _send(self, action, tokens):
+        if not self.ws or not tokens:
+            return
+        by_exchange = {}
+        for token, exchange in tokens:
+            by_exchange.setdefault(EXCHANGE_TYPES.get(exchange, 1), []).append(token)
+        await self.ws.send(json.dumps({
+            "correlationID": uuid.uuid4().hex[:10],
+            "action": action,
+            "params": {
+                "mode": MODE_QUOTE,
+                "tokenList": [{"exchangeType": k, "tokens": v} for k, v in by_exchange.items()],
+            },
+        }))
+
+    def update(self, added, removed):
+        """Called on the feed loop when the watchlists change."""
+        asyncio.ensure_future(self._send(SUBSCRIBE, added))
+        asyncio.ensure_future(self._send(UNSUBSCRIBE, removed))
+
+    async def _heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await ws.send("ping")
+
+    async def run(self, feed):
+        delay = 1
+        while not feed.stopped:
+            heartbeat = None
+            try:
+                if not await asyncio.to_thread(session.ensure):
+                    raise RuntimeError("SmartAPI authentication failed")
+                self.ws = await self._connect()
+                await self._send(SUBSCRIBE, list(feed.tokens.items()))
+                heartbeat = asyncio.ensure_future(self._heartbeat(self.ws))
+                delay = 1
+                async for msg in self.ws:
+                    if isinstance(msg, bytes):
+                        tick = parse_tick(msg)
+                        if tick:
+                            feed.on_tick(*tick)
+            except Exception as e:
+                print("Live feed error:", e)
+            finally:
+                if heartbeat:
+                    heartbeat.cancel()
+                if self.ws:
+                    await self.ws.close()
+                self.ws = None
+            if not feed.stopped:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+class LiveFeed:
+    """Keeps the LTP table subscribed to every token in every watchlist."""
+
+    def __init__(self, source):
+        self.source = source
+        self.table = LtpTable()
+        self.tokens = {}            # token -> exchange
+        self.symbols = {}           # (exchange, trading_symbol) -> token
+        self.bars = None            # optional indicators.LiveBars kept in step with the ticks
+        self.stopped = False
+        self.ticks = 0
+        self.last_tick_at = None
+        self._loop = None
+        self._thread = None
+
+    def set_watchlist(self, rows):
+        """Subscribe to exactly the tokens in `rows` (exchange, trading_symbol, symbol_token)."""
+        tokens = {str(r["symbol_token"]): r["exchange"] for r in rows}
+        self.symbols = {(r["exchange"], r["trading_symbol"]): str(r["symbol_token"]) for r in rows}
+        added = [(t, e) for t, e in tokens.items() if t not in self.tokens]
+        removed = [(t, e) for t, e in self.tokens.items() if t not in tokens]
+        self.tokens = tokens
+        if self._loop and self._loop.is_running() and (added or removed):
+            self._loop.call_soon_threadsafe(self.source.update, added, removed)
+        if self.bars is not None:
+            for token, _ in removed:
+                self._on_feed_thread(self.bars.remove, token)
+
+    def _on_feed_thread(self, fn, *args):
+        """Run a `bars` write on the feed thread, its only writer (or right here before it starts)."""
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(fn, *args)
+        else:
+            fn(*args)
+
+    def seed_bars(self, token, candles):
+        """Replay a symbol's history into `bars`."""
+        if self.bars is None or str(token) in self.bars.rows:
+            return
+        self._on_feed_thread(self._seed, token, candles)
+
+    def _seed(self, token, candles):
+        if str(token) not in self.bars.rows:      # a second refresh may have queued the same symbol
+            self.bars.seed(token, candles)
+
+    def token_for(self, exchange, trading_symbol):
+        return self.symbols.get((exchange, trading_symbol))
+
+    def on_tick(self, token, ltp, close=None, ts=None):
+        self.table.update(token, ltp, close, ts)
+        if self.bars is not None:
+            self.bars.on_tick(token, ltp, ts if ts else int(time.time() * 1000))
+        self.ticks += 1
+        self.last_tick_at = time.time()
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        await self.source.run(self)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.stopped = False
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True, name="live-feed")
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self.stopped = True
+        if self._loop and self._loop.is_running() and getattr(self.source, "ws", None):
+            asyncio.run_coroutine_threadsafe(self.source.ws.close(), self._loop)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def status(self):
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "subscribed": len(self.tokens),
+            "priced": len(self.table),
+            "ticks": self.ticks,
+            "last_tick_age": round(time.time() - self.last_tick_at, 3) if self.last_tick_at else None,
+        }
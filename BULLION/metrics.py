@@ -0,0 +1,270 @@
+"""Prometheus-style counters and histograms for the hot paths, plus request traces.
+
+Everything is recorded into one in-process registry that both apps expose at
+/metrics in the text exposition format. `timed(histogram, **labels)` times a
+block into a histogram. If the current request is traced, the block is also
+added to the trace's per-stage totals.
+
+Tracing is per request. A request carrying X-Request-ID is always traced
+under that id; with TRACE_REQUESTS=1 every request is traced under a fresh
+one. A traced request echoes the id in X-Request-ID and logs one JSON line
+with its status, duration and time per stage. Work handed to a thread pool
+keeps the trace if the callable is wrapped with `propagate`.
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "0") == "1"
+TRACE_HEADER = "X-Request-ID"
+
+# Seconds; spans a cached scan row (~1 ms) up to a throttled broker call or a cold list scan
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), v) for key, v in sorted(self._values.items())]
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}           # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames))
+        return entry[-1] if entry else 0
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), entry[:len(self.buckets)] + [0]):
+                cumulative += n
+                out.append((f"{self.name}_bucket",
+                            _labels(self.labelnames, key, [("le", _number(bound))]),
+                            cumulative if bound != float("inf") else entry[-1]))
+            out.append((f"{self.name}_sum", _labels(self.labelnames, key), round(entry[-2], 6)))
+            out.append((f"{self.name}_count", _labels(self.labelnames, key), entry[-1]))
+        return out
+
+
+class Gauge:
+    """A value read from a callback at scrape time: fn() -> {label tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames, fn):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"Gauge {self.name} error: {e}")
+            return []
+        return [(self.name, _labels(self.labelnames, key), v) for key, v in sorted(values.items())]
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram, name, help, labelnames, buckets)
+
+    def gauge(self, name, help, labelnames, fn):
+        return self._add(Gauge, name, help, labelnames, fn)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("bullion_stage_seconds", "Time per scan stage.", ("stage",))
+DB_QUERY_SECONDS = registry.histogram("bullion_db_query_seconds", "Database statement time.", ("statement",))
+BROKER_CALL_SECONDS = registry.histogram("bullion_broker_call_seconds", "SmartAPI call time, excluding rate-limit waits.",
+                                         ("endpoint", "outcome"))
+RATE_LIMIT_WAIT_SECONDS = registry.histogram("bullion_rate_limit_wait_seconds", "Time spent queued for a broker token.",
+                                             ("endpoint",))
+SCAN_CACHE_LOOKUPS = registry.counter("bullion_scan_cache_lookups_total", "Scan cache lookups.", ("result",))
+LOGIN_SECONDS = registry.histogram("bullion_login_seconds", "SmartAPI login time.", ("outcome",))
+HTTP_REQUEST_SECONDS = registry.histogram("bullion_http_request_seconds", "Request handling time.",
+                                          ("app", "endpoint", "status"))
+
+
+# ---------------- tracing ----------------
+class Trace:
+
+    __slots__ = ("id", "stages", "_lock")
+
+    def __init__(self, trace_id):
+        self.id = trace_id
+        self.stages = {}            # stage -> [calls, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self):
+        with self._lock:
+            return {stage: {"calls": n, "ms": round(s * 1000, 3)} for stage, (n, s) in self.stages.items()}
+
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def propagate(fn):
+    """Wrap fn so it records into the caller's trace when run on another thread."""
+    trace = _trace.get()
+    if trace is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _trace.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _trace.reset(token)
+    return run
+
+
+def observe(histogram, seconds, span=None, **labels):
+    histogram.observe(seconds, **labels)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(span or next(iter(labels.values()), histogram.name), seconds)
+
+
+@contextmanager
+def timed(histogram, span=None, **labels):
+    """Time the block into `histogram` (and the current trace, under `span` or the first label)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(histogram, time.perf_counter() - start, span, **labels)
+
+
+# ---------------- Flask ----------------
+def install(app, name):
+    """Request timing, trace ids and a /metrics route for one Flask app."""
+    from flask import Response, request, g
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        trace_id = request.headers.get(TRACE_HEADER) or (uuid.uuid4().hex[:16] if TRACE_REQUESTS else None)
+        g.metrics_trace = _trace.set(Trace(trace_id[:64])) if trace_id else None
+
+    @app.after_request
+    def _finish_request(resp):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return resp
+        elapsed = time.perf_counter() - start
+        HTTP_REQUEST_SECONDS.observe(elapsed, app=name, endpoint=request.endpoint or "unmatched",
+                                     status=resp.status_code)
+        token = g.pop("metrics_trace", None)
+        if token is not None:
+            trace = _trace.get()
+            _trace.reset(token)
+            resp.headers[TRACE_HEADER] = trace.id
+            print(json.dumps({"trace_id": trace.id, "app": name, "method": request.method, "path": request.path,
+                              "status": resp.status_code, "ms": round(elapsed * 1000, 3),
+                              "stages": trace.summary()}))
+        return resp
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,160 @@
+"""Grid search over the Shooting Star thresholds on stored candle history.
+
+The OHLCV batch is loaded once and copied into multiprocessing shared memory.
+Each pool worker maps the same blocks as NumPy views, so the dataset is never
+pickled or duplicated per process. The grid is split by the parameters that
+change which bars signal (trend length, shadow ratios). A task extracts those
+signals once and then runs every (entry_buffer, risk_reward) pair over them.
+Ranked results are written to Parquet.
+"""
+import os
+import time
+import argparse
+import itertools
+import datetime as dt
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from candle_store import store, to_millis, CANDLE_STORE_DIR
+from pattern_engine import CandleBatch, TREND_BARS, UPPER_SHADOW_RATIO, LOWER_SHADOW_RATIO
+from backtest import load_batch, Signals, simulate, summarize, ENTRY_BARS, MAX_HOLD, BACKTEST_YEARS
+from strategy import ENTRY_BUFFER, RISK_REWARD, INTERVAL
+
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+SWEEP_DIR = os.getenv("SWEEP_DIR", os.path.join(os.path.dirname(CANDLE_STORE_DIR), "sweeps"))
+
+ARRAYS = ("time", "open", "high", "low", "close", "lengths")
+
+
+class SharedBatch:
+    """A CandleBatch whose arrays live in named shared-memory blocks."""
+
+    def __init__(self, batch):
+        self.blocks = []
+        self.spec = {}
+        for name in ARRAYS:
+            arr = getattr(batch, name)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+            self.blocks.append(shm)
+            self.spec[name] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+
+_batch = None
+_blocks = []
+
+
+def _attach(spec):
+    """Pool initializer: map the parent's blocks into this worker."""
+    global _batch
+    arrays = {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _blocks.append(shm)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    _batch = CandleBatch(arrays["time"], arrays["open"], arrays["high"], arrays["low"], arrays["close"],
+                         None, arrays["lengths"])
+
+
+def _run(task):
+    trend_bars, upper_ratio, lower_ratio, entry_buffers, risk_rewards, entry_bars, max_hold = task
+    signals = Signals(_batch, entry_bars, max_hold, trend_bars, upper_ratio, lower_ratio)
+    results = []
+    for buffer, rr in itertools.product(entry_buffers, risk_rewards):
+        results.append({"trend_bars": trend_bars, "upper_ratio": upper_ratio, "lower_ratio": lower_ratio,
+                        "entry_buffer": buffer, "risk_reward": rr,
+                        **summarize(simulate(signals, buffer, rr))})
+    return results
+
+
+def rank(results):
+    """Best expectancy first; ties broken by shallower drawdown, then more trades."""
+    def key(r):
+        expectancy = r["expectancy_r"] if r["expectancy_r"] is not None else -np.inf
+        return (-expectancy, r["max_drawdown_r"], -r["trades"])
+    return sorted(results, key=key)
+
+
+def run_sweep(batch, trend_bars=(TREND_BARS,), upper_ratios=(UPPER_SHADOW_RATIO,),
+              lower_ratios=(LOWER_SHADOW_RATIO,), entry_buffers=(ENTRY_BUFFER,), risk_rewards=(RISK_REWARD,),
+              entry_bars=ENTRY_BARS, max_hold=MAX_HOLD, workers=SWEEP_WORKERS):
+    """Evaluate the full grid across a process pool; returns ranked summary dicts."""
+    tasks = [(t, u, l, tuple(entry_buffers), tuple(risk_rewards), entry_bars, max_hold)
+             for t, u, l in itertools.product(trend_bars, upper_ratios, lower_ratios)]
+    shared = SharedBatch(batch)
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_attach,
+                                 initargs=(shared.spec,)) as executor:
+            results = [r for chunk in executor.map(_run, tasks) for r in chunk]
+    finally:
+        shared.close()
+    ranked = rank(results)
+    for i, r in enumerate(ranked, 1):
+        r["rank"] = i
+    return ranked
+
+
+def write_results(results, path=None):
+    """Ranked results as one Parquet row per parameter combination."""
+    if path is None:
+        os.makedirs(SWEEP_DIR, exist_ok=True)
+        path = os.path.join(SWEEP_DIR, f"sweep-{dt.datetime.now():%Y%m%d-%H%M%S}.parquet")
+    columns = list(results[0]) if results else ["rank"]
+    pq.write_table(pa.table({c: [r.get(c) for r in results] for c in columns}), path)
+    return path
+
+
+def _floats(text):
+    return [float(v) for v in text.split(",")]
+
+
+def _ints(text):
+    return [int(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Shooting Star thresholds over stored candles.")
+    parser.add_argument("--list", default=None, help="watchlist name (default: every series in the store)")
+    parser.add_argument("--years", type=float, default=BACKTEST_YEARS)
+    parser.add_argument("--trend-bars", type=_ints, default=[TREND_BARS])
+    parser.add_argument("--upper", type=_floats, default=[UPPER_SHADOW_RATIO], help="upper shadow / body ratios")
+    parser.add_argument("--lower", type=_floats, default=[LOWER_SHADOW_RATIO], help="lower shadow / body ratios")
+    parser.add_argument("--buffer", type=_floats, default=[ENTRY_BUFFER])
+    parser.add_argument("--rr", type=_floats, default=[RISK_REWARD])
+    parser.add_argument("--entry-bars", type=int, default=ENTRY_BARS)
+    parser.add_argument("--max-hold", type=int, default=MAX_HOLD)
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    parser.add_argument("--out", default=None, help="Parquet output path")
+    args = parser.parse_args()
+
+    if args.list:
+        from shooting_star import get_watchlist
+        symbols = get_watchlist(args.list)
+    else:
+        symbols = [{"exchange": ex, "symbol_token": token} for ex, token in store.series(INTERVAL)]
+    start = to_millis(dt.datetime.now() - dt.timedelta(days=365 * args.years))
+
+    t0 = time.perf_counter()
+    batch = load_batch(symbols, INTERVAL, start=start)
+    t1 = time.perf_counter()
+    results = run_sweep(batch, args.trend_bars, args.upper, args.lower, args.buffer, args.rr,
+                        args.entry_bars, args.max_hold, args.workers)
+    t2 = time.perf_counter()
+    path = write_results(results, args.out)
+
+    print(f"{len(symbols)} symbols, {int(batch.lengths.sum())} bars, {len(results)} combinations: "
+          f"load {t1 - t0:.2f}s, sweep {t2 - t1:.2f}s -> {path}")
+    for r in results[:10]:
+        print(r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Batch (N symbols x T bars) version of the Shooting Star scan.
+
+Candles are held as 2-D float64 arrays, one row per symbol, right-aligned so
+the latest bar of every symbol sits in the last column. Shorter histories are
+left-padded with NaN; every comparison against NaN is False, so padded bars can
+never satisfy a pattern. All masks are computed with the same float operations
+as the scalar helpers in shooting_star.py, so the results match them exactly.
+"""
+import numpy as np
+
+from candle_store import format_time
+from candle_series import CandleSeries
+from strategy import (ENTRY_BUFFER, RISK_REWARD, MIN_BARS, TREND_BARS,
+                      UPPER_SHADOW_RATIO, LOWER_SHADOW_RATIO)
+
+
+class CandleBatch:
+    """Struct-of-arrays OHLCV block for many symbols."""
+
+    __slots__ = ("time", "open", "high", "low", "close", "volume", "lengths")
+
+    def __init__(self, time, open, high, low, close, volume, lengths):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.lengths = lengths
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    @classmethod
+    def from_candles(cls, candle_lists, bars=None):
+        """Stack per-symbol candles: the CandleSeries get_candles returns, or lists of candle dicts."""
+        n = len(candle_lists)
+        width = bars or max((len(c) for c in candle_lists), default=0)
+        cols = {k: np.full((n, width), np.nan) for k in ("open", "high", "low", "close", "volume")}
+        time = np.full((n, width), None, dtype=object)
+        lengths = np.zeros(n, dtype=np.int64)
+
+        for i, candles in enumerate(candle_lists):
+            candles = candles[-width:] if width else []
+            m = len(candles)
+            lengths[i] = m
+            if not m:
+                continue
+            if isinstance(candles, CandleSeries):
+                for k, arr in cols.items():
+                    arr[i, width - m:] = getattr(candles, k)
+                time[i, width - m:] = [format_time(t) for t in candles.time.tolist()]
+                continue
+            for k, arr in cols.items():
+                arr[i, width - m:] = [c[k] for c in candles]
+            time[i, width - m:] = [c["time"] for c in candles]
+
+        return cls(time, cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"], lengths)
+
+
+def uptrend_mask(close, bars=TREND_BARS):
+    """mask[i, t] is True when close[i, t-bars+1 .. t] is strictly increasing."""
+    n, t = close.shape
+    mask = np.zeros((n, t), dtype=bool)
+    if t < bars:
+        return mask
+    rising = close[:, 1:] > close[:, :-1]          # rising[:, j] compares bar j+1 with bar j
+    window = np.ones((n, t - bars + 1), dtype=bool)
+    for k in range(bars - 1):
+        window &= rising[:, k:k + t - bars + 1]
+    mask[:, bars - 1:] = window
+    return mask
+
+
+def shooting_star_mask(open, high, low, close,
+                       upper_ratio=UPPER_SHADOW_RATIO, lower_ratio=LOWER_SHADOW_RATIO):
+    """Element-wise is_shooting_star over any array shape."""
+    body = np.abs(close - open)
+    upper_shadow = high - np.maximum(open, close)
+    lower_shadow = np.minimum(open, close) - low
+    with np.errstate(invalid="ignore"):
+        return ((body != 0)
+                & (upper_shadow >= upper_ratio * body)
+                & (lower_shadow <= lower_ratio * body)
+                & (close < open))
+
+
+def level_arrays(low, high, entry_buffer=ENTRY_BUFFER, risk_reward=RISK_REWARD):
+    """Unrounded entry/stop/target, same arithmetic as compute_levels."""
+    entry = low * (1.0 - entry_buffer)
+    stop = high
+    risk = stop - entry
+    target = entry - risk_reward * risk
+    return entry, stop, target
+
+
+def rounded_level_arrays(low, high, entry_buffer=ENTRY_BUFFER, risk_reward=RISK_REWARD):
+    """Entry/stop/target arrays equal to compute_levels() bit for bit.
+
+    np.round differs from round() on some halfway cases, so each value goes
+    through round(); callers only pass the bars that signalled.
+    """
+    return tuple(np.array([round(v, 2) for v in arr.tolist()])
+                 for arr in level_arrays(np.asarray(low, dtype=np.float64), np.asarray(high, dtype=np.float64),
+                                         entry_buffer, risk_reward))
+
+
+def scan_batch(batch, trend_bars=TREND_BARS, min_bars=MIN_BARS,
+               upper_ratio=UPPER_SHADOW_RATIO, lower_ratio=LOWER_SHADOW_RATIO,
+               entry_buffer=ENTRY_BUFFER, risk_reward=RISK_REWARD):
+    """Evaluate the last bar of every symbol in one pass.
+
+    Returns a dict of length-N arrays: enough_bars, uptrend, shooting_star,
+    eligible and entry/stop/target. Levels are NaN for ineligible symbols and
+    rounded with Python's round() for eligible ones so they equal
+    compute_levels() bit for bit.
+    """
+    n, t = batch.shape
+    enough = batch.lengths >= min_bars
+    if t == 0:
+        empty = np.zeros(n, dtype=bool)
+        nan = np.full(n, np.nan)
+        return {"enough_bars": enough, "uptrend": empty, "shooting_star": empty,
+                "eligible": empty, "entry": nan, "stop": nan, "target": nan.copy()}
+
+    if t >= trend_bars + 1:
+        uptrend = uptrend_mask(batch.close[:, -(trend_bars + 1):-1], trend_bars)[:, -1]
+    else:
+        uptrend = np.zeros(n, dtype=bool)
+    star = shooting_star_mask(batch.open[:, -1], batch.high[:, -1], batch.low[:, -1], batch.close[:, -1],
+                              upper_ratio, lower_ratio)
+    eligible = enough & uptrend & star
+
+    entry = np.full(n, np.nan)
+    stop = np.full(n, np.nan)
+    target = np.full(n, np.nan)
+    idx = np.flatnonzero(eligible)
+    if idx.size:
+        entry[idx], stop[idx], target[idx] = rounded_level_arrays(batch.low[idx, -1], batch.high[idx, -1],
+                                                                  entry_buffer, risk_reward)
+
+    return {"enough_bars": enough, "uptrend": uptrend, "shooting_star": star,
+            "eligible": eligible, "entry": entry, "stop": stop, "target": target}
+
+
+def scan_results(symbols, batch, **params):
+    """Same result dicts as scan_symbol, one per row of the batch."""
+    out = scan_batch(batch, **params)
+    results = []
+    for i, symbol in enumerate(symbols):
+        if not out["enough_bars"][i]:
+            results.append({"symbol": symbol, "eligible": False, "reason": "not_enough_candles"})
+        elif not out["uptrend"][i]:
+            results.append({"symbol": symbol, "eligible": False, "reason": "no_uptrend"})
+        elif not out["shooting_star"][i]:
+            results.append({"symbol": symbol, "eligible": False, "reason": "no_shooting_star"})
+        else:
+            results.append({
+                "symbol": symbol,
+                "eligible": True,
+                "pattern": "Shooting Star",
+                "candle_time": batch.time[i, -1],
+                "entry_sell": float(out["entry"][i]),
+                "stop_loss": float(out["stop"][i]),
+                "target": float(out["target"][i])
+            })
+    return results
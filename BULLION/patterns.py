@@ -0,0 +1,160 @@
+"""Registry of candlestick patterns and indicator screens.
+
+A detector is registered with the number of bars it needs and receives a
+Bars view over one symbol's candles. The view builds its NumPy columns once,
+so every requested detector reads the same arrays and a multi-pattern scan
+still fetches each symbol's candles only once. Detectors return a dict with
+at least a boolean "signal"; anything else in it is passed through to the
+response (levels, indicator values).
+"""
+import numpy as np
+
+from candle_series import CandleSeries
+
+PATTERNS = {}
+
+RSI_PERIOD = 14
+RSI_OVERSOLD = 30.0
+RSI_OVERBOUGHT = 70.0
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+
+class Pattern:
+    __slots__ = ("name", "bars", "label", "detect")
+
+    def __init__(self, name, bars, label, detect):
+        self.name = name
+        self.bars = bars
+        self.label = label
+        self.detect = detect
+
+
+def register_pattern(name, bars, label=None):
+    """Decorator adding a detector to the registry under `name`."""
+    def wrap(fn):
+        PATTERNS[name] = Pattern(name, bars, label or name.replace("_", " ").title(), fn)
+        return fn
+    return wrap
+
+
+class Bars:
+    """One symbol's candles with float64 columns, taken from a CandleSeries or built lazily from dicts."""
+
+    def __init__(self, candles):
+        self.candles = candles
+        self._cols = {}
+
+    def __len__(self):
+        return len(self.candles)
+
+    def __getattr__(self, name):
+        if name not in ("open", "high", "low", "close", "volume"):
+            raise AttributeError(name)
+        if name not in self._cols:
+            if isinstance(self.candles, CandleSeries):
+                return getattr(self.candles, name)
+            self._cols[name] = np.array([c[name] for c in self.candles], dtype=np.float64)
+        return self._cols[name]
+
+
+def bars_needed(names):
+    return max((PATTERNS[n].bars for n in names), default=0)
+
+
+def evaluate_patterns(trading_symbol, candles, names):
+    """Run every detector in `names` over the same candles."""
+    bars = Bars(candles)
+    results = {}
+    for name in names:
+        pattern = PATTERNS[name]
+        if len(bars) < pattern.bars:
+            results[name] = {"signal": False, "reason": "not_enough_candles"}
+            continue
+        results[name] = pattern.detect(bars)
+    matched = [n for n, r in results.items() if r.get("signal")]
+    return {
+        "symbol": trading_symbol,
+        "candle_time": candles[-1]["time"] if candles else None,
+        "eligible": bool(matched),
+        "matched": [PATTERNS[n].label for n in matched],
+        "patterns": results,
+    }
+
+
+def _body(o, c):
+    return abs(c - o)
+
+
+def ema(values, period):
+    out = np.empty_like(values)
+    alpha = 2.0 / (period + 1)
+    out[0] = values[0]
+    for i in range(1, len(values)):
+        out[i] = alpha * values[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def rsi(closes, period=RSI_PERIOD):
+    """Wilder's RSI of the last bar."""
+    delta = np.diff(closes)
+    gain = np.clip(delta, 0, None)
+    loss = np.clip(-delta, 0, None)
+    avg_gain = gain[:period].mean()
+    avg_loss = loss[:period].mean()
+    for g, l in zip(gain[period:], loss[period:]):
+        avg_gain = (avg_gain * (period - 1) + g) / period
+        avg_loss = (avg_loss * (period - 1) + l) / period
+    if avg_loss == 0:
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+@register_pattern("doji", bars=1)
+def detect_doji(bars):
+    o, h, l, c = bars.open[-1], bars.high[-1], bars.low[-1], bars.close[-1]
+    rng = h - l
+    return {"signal": bool(rng > 0 and _body(o, c) <= 0.1 * rng)}
+
+
+@register_pattern("hammer", bars=6)
+def detect_hammer(bars):
+    """Mirror of the Shooting Star: long lower shadow after five falling closes."""
+    closes = bars.close[-6:-1]
+    downtrend = bool(np.all(closes[1:] < closes[:-1]))
+    o, h, l, c = bars.open[-1], bars.high[-1], bars.low[-1], bars.close[-1]
+    body = _body(o, c)
+    if body == 0 or not downtrend:
+        return {"signal": False}
+    upper_shadow = h - max(o, c)
+    lower_shadow = min(o, c) - l
+    return {"signal": bool(lower_shadow >= 2 * body and upper_shadow <= 0.1 * body)}
+
+
+@register_pattern("bullish_engulfing", bars=2)
+def detect_bullish_engulfing(bars):
+    po, pc, o, c = bars.open[-2], bars.close[-2], bars.open[-1], bars.close[-1]
+    return {"signal": bool(pc < po and c > o and o <= pc and c >= po)}
+
+
+@register_pattern("bearish_engulfing", bars=2)
+def detect_bearish_engulfing(bars):
+    po, pc, o, c = bars.open[-2], bars.close[-2], bars.open[-1], bars.close[-1]
+    return {"signal": bool(pc > po and c < o and o >= pc and c <= po)}
+
+
+@register_pattern("rsi", bars=RSI_PERIOD + 1, label="RSI")
+def detect_rsi(bars):
+    value = rsi(bars.close)
+    zone = "oversold" if value <= RSI_OVERSOLD else "overbought" if value >= RSI_OVERBOUGHT else None
+    return {"signal": zone is not None, "value": round(value, 2), "zone": zone}
+
+
+@register_pattern("macd", bars=MACD_SLOW + MACD_SIGNAL, label="MACD")
+def detect_macd(bars):
+    """Signal when the MACD line crosses its signal line on the last bar."""
+    line = ema(bars.close, MACD_FAST) - ema(bars.close, MACD_SLOW)
+    signal_line = ema(line, MACD_SIGNAL)
+    hist = line - signal_line
+    cross = "bullish" if hist[-2] <= 0 < hist[-1] else "bearish" if hist[-2] >= 0 > hist[-1] else None
+    return {"signal": cross is not None, "cross": cross,
+            "macd": round(float(line[-1]), 4), "signal_line": round(float(signal_line[-1]), 4)}
@@ -0,0 +1,200 @@
+"""Shared token-bucket rate limiting for SmartAPI endpoints.
+
+Callers reserve a token and then sleep until it is theirs, so waiting threads
+(or coroutines, via acquire_async) are released in arrival order at exactly the
+configured rate instead of sleeping a fixed amount. When the broker answers
+with a rate-limit error the endpoint's rate is halved and the call is retried
+with jittered exponential backoff; successful calls slowly restore the rate.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+from metrics import timed, observe, registry, BROKER_CALL_SECONDS, RATE_LIMIT_WAIT_SECONDS
+
+# Requests per second per endpoint, overridable with e.g. RATE_LIMIT_GETCANDLEDATA=2.5
+DEFAULT_RATES = {
+    "getCandleData": 3.0,
+    "searchScrip": 1.0,
+    "ltpData": 10.0,
+}
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))
+MIN_RATE_FRACTION = 0.1          # never adapt below 10% of the configured rate
+RECOVERY_STEP = 0.05             # fraction of the configured rate regained per success
+
+
+def is_rate_limit_error(resp):
+    """True for SmartAPI's 'exceeding access rate' failures, raised or returned."""
+    if isinstance(resp, Exception):
+        text = str(resp).lower()
+        return getattr(resp, "code", None) == 429 or "access rate" in text or "rate limit" in text
+    if isinstance(resp, dict) and resp.get("status") is False:
+        text = str(resp.get("message") or "").lower()
+        return "access rate" in text or "rate limit" in text
+    return False
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst=1.0):
+        self.configured_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take one token (possibly going into debt) and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            with self._lock:
+                self.waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            with self._lock:
+                self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(self.configured_rate * MIN_RATE_FRACTION, self.rate * 0.5)
+
+    def speed_up(self):
+        if self.rate < self.configured_rate:
+            with self._lock:
+                self.rate = min(self.configured_rate, self.rate + self.configured_rate * RECOVERY_STEP)
+
+
+class RateLimiter:
+    """One TokenBucket per endpoint name, created on first use."""
+
+    def __init__(self, rates=None):
+        self.rates = dict(DEFAULT_RATES)
+        for name in list(self.rates):
+            env = os.getenv(f"RATE_LIMIT_{name.upper()}")
+            if env:
+                self.rates[name] = float(env)
+        self.rates.update(rates or {})
+        self.buckets = {}
+        self.throttled = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint):
+        with self._lock:
+            if endpoint not in self.buckets:
+                self.buckets[endpoint] = TokenBucket(self.rates.get(endpoint, 1.0))
+                self.throttled[endpoint] = 0
+            return self.buckets[endpoint]
+
+    def _backoff(self, attempt):
+        return BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        """Run fn under the endpoint's quota, retrying rate-limit failures."""
+        bucket = self.bucket(endpoint)
+        for attempt in range(MAX_RETRIES + 1):
+            with timed(RATE_LIMIT_WAIT_SECONDS, "rate_limit_wait", endpoint=endpoint):
+                bucket.acquire()
+            start = time.perf_counter()
+            try:
+                resp = fn(*args, **kwargs)
+            except Exception as e:
+                self._observe(endpoint, start, e)
+                if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                    raise
+                resp = e
+            else:
+                self._observe(endpoint, start, resp)
+            if not is_rate_limit_error(resp):
+                bucket.speed_up()
+                return resp
+            self._throttled(endpoint, bucket)
+            if attempt == MAX_RETRIES:
+                return resp
+            time.sleep(self._backoff(attempt))
+
+    async def call_async(self, endpoint, fn, *args, **kwargs):
+        """call() for coroutine functions."""
+        bucket = self.bucket(endpoint)
+        for attempt in range(MAX_RETRIES + 1):
+            with timed(RATE_LIMIT_WAIT_SECONDS, "rate_limit_wait", endpoint=endpoint):
+                await bucket.acquire_async()
+            start = time.perf_counter()
+            try:
+                resp = await fn(*args, **kwargs)
+            except Exception as e:
+                self._observe(endpoint, start, e)
+                if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                    raise
+                resp = e
+            else:
+                self._observe(endpoint, start, resp)
+            if not is_rate_limit_error(resp):
+                bucket.speed_up()
+                return resp
+            self._throttled(endpoint, bucket)
+            if attempt == MAX_RETRIES:
+                return resp
+            await asyncio.sleep(self._backoff(attempt))
+
+    @staticmethod
+    def _observe(endpoint, start, resp):
+        if is_rate_limit_error(resp):
+            outcome = "rate_limited"
+        elif isinstance(resp, Exception) or (isinstance(resp, dict) and resp.get("status") is False):
+            outcome = "error"
+        else:
+            outcome = "ok"
+        observe(BROKER_CALL_SECONDS, time.perf_counter() - start, f"broker:{endpoint}",
+                endpoint=endpoint, outcome=outcome)
+
+    def _throttled(self, endpoint, bucket):
+        bucket.slow_down()
+        with self._lock:
+            self.throttled[endpoint] += 1
+
+    def queue_depth(self, endpoint=None):
+        if endpoint is not None:
+            return self.bucket(endpoint).waiting
+        return sum(b.waiting for b in self.buckets.values())
+
+    def metrics(self):
+        return {
+            name: {
+                "configured_rate": b.configured_rate,
+                "rate": round(b.rate, 3),
+                "queue_depth": b.waiting,
+                "throttled": self.throttled[name],
+            }
+            for name, b in list(self.buckets.items())
+        }
+
+
+limiter = RateLimiter()
+registry.gauge("bullion_rate_limit_queue_depth", "Callers waiting for a broker token.", ("endpoint",),
+               lambda: {(name,): b.waiting for name, b in list(limiter.buckets.items())})
+registry.gauge("bullion_rate_limit_rate", "Current adaptive request rate.", ("endpoint",),
+               lambda: {(name,): round(b.rate, 3) for name, b in list(limiter.buckets.items())})
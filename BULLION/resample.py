@@ -0,0 +1,86 @@
+"""Session-aware resampling of intraday bars.
+
+Only BASE_INTERVAL bars are fetched from the broker and stored. Coarser
+intraday intervals are built from them. Buckets are anchored at the NSE open
+(09:15 IST), so hourly bars run 09:15-10:15 ... 14:15-15:15 and then a
+short 15:15-15:30 bar, as the exchange and SmartAPI draw them. Base bars
+outside the session are dropped. Aggregation runs over contiguous runs of
+equal bucket ids with ufunc.reduceat. When new base bars continue what a
+Resampled series already holds, it only re-aggregates from the start of its
+last (possibly still forming) bucket; any other base is resampled in full.
+"""
+import os
+import numpy as np
+
+from candle_store import INTERVAL_SECONDS, MARKET_OPEN, MARKET_CLOSE, IST
+from candle_series import CandleSeries
+
+BASE_INTERVAL = os.getenv("INTRADAY_BASE_INTERVAL", "FIVE_MINUTE")
+
+DAY_MS = 86_400_000
+IST_OFFSET_MS = int(IST.utcoffset(None).total_seconds() * 1000)
+OPEN_MS = (MARKET_OPEN.hour * 60 + MARKET_OPEN.minute) * 60_000
+CLOSE_MS = (MARKET_CLOSE.hour * 60 + MARKET_CLOSE.minute) * 60_000
+
+# Every intraday interval that is a whole multiple of the base one is derived from it
+RESAMPLED = {
+    name: secs for name, secs in INTERVAL_SECONDS.items()
+    if secs > INTERVAL_SECONDS[BASE_INTERVAL] and secs % INTERVAL_SECONDS[BASE_INTERVAL] == 0
+}
+
+
+def bucket_starts(times, interval):
+    """Epoch-ms start of the session-anchored bucket of each bar, and the in-session mask."""
+    times = np.asarray(times, dtype=np.int64)
+    step = RESAMPLED[interval] * 1000
+    day = (times + IST_OFFSET_MS) // DAY_MS * DAY_MS - IST_OFFSET_MS
+    since_open = times - day - OPEN_MS
+    in_session = (since_open >= 0) & (times - day < CLOSE_MS)
+    return day + OPEN_MS + since_open // step * step, in_session
+
+
+def resample_arrays(times, open, high, low, close, volume, interval):
+    """Aggregate sorted base bars into `interval` bars. Returns (times, open, high, low, close, volume)."""
+    buckets, keep = bucket_starts(times, interval)
+    buckets = buckets[keep]
+    if not len(buckets):
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty
+    open, high, low, close, volume = (np.asarray(a, dtype=np.float64)[keep] for a in (open, high, low, close, volume))
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    last = np.r_[first[1:] - 1, len(buckets) - 1]
+    return (buckets[first], open[first], np.maximum.reduceat(high, first), np.minimum.reduceat(low, first),
+            close[last], np.add.reduceat(volume, first))
+
+
+class Resampled:
+    """One series at a derived interval, kept in step with its base bars."""
+
+    __slots__ = ("interval", "base_start", "bars")
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.base_start = None
+        self.bars = CandleSeries.empty()
+
+    def update(self, base):
+        """Fold in base bars.
+
+        Bars are updated in place only when base reaches back to the last
+        bucket built so far; a base that starts earlier, or leaves a gap after
+        what was resampled, is resampled from scratch.
+        """
+        if not len(base):
+            return
+        first = int(base.time[0])
+        since = self.bars.time[-1] if len(self.bars) else self.base_start
+        if self.base_start is None or first < self.base_start or first > since:
+            self.base_start, kept, tail = first, CandleSeries.empty(), base
+        else:
+            # Everything before the last bucket is final; redo that bucket and anything newer
+            tail = base[np.searchsorted(base.time, since):]
+            kept = self.bars[:np.searchsorted(self.bars.time, since)]
+        self.bars = CandleSeries.concat(kept, CandleSeries(*resample_arrays(*tail.columns(), self.interval)))
+
+    def slice(self, from_ms, to_ms):
+        return self.bars.between(from_ms, to_ms)
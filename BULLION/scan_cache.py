@@ -0,0 +1,195 @@
+"""Scan results cached per symbol until its candle series moves.
+
+Each result is stored with the version of the series it was computed from:
+the watermark's (last_bar, checked_at), which only changes when the broker is
+asked for newer bars. While the loader says no new bar can exist yet, the
+stored result is served without loading candles, so a list scan reruns only
+the symbols whose series moved. A list's ETag is a digest of the list, the
+pattern set and every symbol's version: it stays the same until a bar arrives
+for some symbol or the list itself changes.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from candle_loader import series_version
+from candle_store import CANDLE_STORE_DIR
+from metrics import propagate, SCAN_CACHE_LOOKUPS
+
+SCAN_RESULTS_DIR = os.getenv("SCAN_RESULTS_DIR", os.path.join(os.path.dirname(CANDLE_STORE_DIR), "scans"))
+WORKER_STATUS_FILE = os.path.join(SCAN_RESULTS_DIR, "status.json")
+WATCHLIST_STAMP_FILE = os.path.join(SCAN_RESULTS_DIR, "watchlists.stamp")
+
+
+class ScanCache:
+
+    def __init__(self):
+        self._entries = {}          # (exchange, token, interval, kind) -> (version, result)
+        self._seeded = set()        # persisted scans already adopted
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(row, interval, kind):
+        return (row["exchange"].upper(), str(row["symbol_token"]), interval, kind)
+
+    def versions(self, symbols, interval):
+        """Current series version for every watchlist row (None: stale or unknown)."""
+        return [series_version(s["exchange"], s["symbol_token"], interval) if s.get("symbol_token") else None
+                for s in symbols]
+
+    def get(self, kind, row, interval, version):
+        if version is None:
+            return None
+        entry = self._entries.get(self._key(row, interval, kind))
+        return entry[1] if entry and entry[0] == version else None
+
+    def put(self, kind, row, interval, result):
+        """Store a freshly computed result; returns the version it was stored under, if any."""
+        if not row.get("symbol_token") or result.get("reason") == "token_not_found":
+            return None
+        # A failed fetch leaves the watermark stale, so that result is not cached
+        version = series_version(row["exchange"], row["symbol_token"], interval)
+        if version is not None:
+            with self._lock:
+                self._entries[self._key(row, interval, kind)] = (version, result)
+        return version
+
+    def seed(self, kind, symbols, interval, saved):
+        """Adopt results persisted by the scan worker that are newer than what is cached here."""
+        if not saved or saved.get("kind") != kind or saved.get("interval") != interval:
+            return 0
+        marker = (kind, saved.get("list"), saved.get("finished_at"))
+        if marker in self._seeded:
+            return 0
+        by_symbol = {(r["exchange"].upper(), str(r["symbol_token"])): (tuple(v), res)
+                     for r, v, res in zip(saved["symbols"], saved["versions"], saved["results"]) if v}
+        adopted = 0
+        with self._lock:
+            self._seeded.add(marker)
+            for s in symbols:
+                if not s.get("symbol_token"):
+                    continue
+                key = self._key(s, interval, kind)
+                found = by_symbol.get(key[:2])
+                entry = self._entries.get(key)
+                if found and (entry is None or found[0][1] > entry[0][1]):
+                    self._entries[key] = found
+                    adopted += 1
+        return adopted
+
+    def split(self, kind, symbols, interval):
+        """(results with None for misses, versions, indexes of the misses)."""
+        versions = self.versions(symbols, interval)
+        results = [self.get(kind, s, interval, v) for s, v in zip(symbols, versions)]
+        stale = [i for i, r in enumerate(results) if r is None]
+        with self._lock:
+            self.hits += len(symbols) - len(stale)
+            self.misses += len(stale)
+        SCAN_CACHE_LOOKUPS.inc(len(symbols) - len(stale), result="hit")
+        SCAN_CACHE_LOOKUPS.inc(len(stale), result="miss")
+        return results, versions, stale
+
+    def scan(self, kind, symbols, interval, compute, workers):
+        """compute(row) for every row whose cached result is missing or stale, in watchlist order."""
+        results, versions, stale = self.split(kind, symbols, interval)
+        if stale:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                compute = propagate(compute)
+                for i, result in zip(stale, executor.map(lambda i: compute(symbols[i]), stale)):
+                    results[i] = result
+                    versions[i] = self.put(kind, symbols[i], interval, result)
+        return results, versions
+
+    def metrics(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def list_etag(list_name, kind, interval, symbols, versions):
+    """Strong ETag for a list scan, or None if any symbol's data may still change."""
+    if any(v is None for v in versions):
+        return None
+    digest = hashlib.sha1(repr((list_name, kind, interval, [
+        (s["exchange"], str(s["symbol_token"]), tuple(v)) for s, v in zip(symbols, versions)
+    ])).encode()).hexdigest()
+    return digest[:32]
+
+
+def last_modified(versions):
+    """When the newest series in the scan was last fetched."""
+    checked = [v[1] for v in versions if v is not None]
+    if not checked:
+        return None
+    return dt.datetime.fromtimestamp(max(checked) // 1000, dt.timezone.utc)
+
+
+def _results_path(list_name, kind, interval):
+    name = hashlib.sha1(f"{list_name}\0{kind}\0{interval}".encode()).hexdigest()[:16]
+    return os.path.join(SCAN_RESULTS_DIR, f"{name}.json")
+
+
+def save_results(list_name, kind, interval, symbols, versions, results, finished_at):
+    """Persist a finished list scan for other processes to serve."""
+    os.makedirs(SCAN_RESULTS_DIR, exist_ok=True)
+    path = _results_path(list_name, kind, interval)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"list": list_name, "kind": kind, "interval": interval, "finished_at": finished_at,
+                   "etag": list_etag(list_name, kind, interval, symbols, versions),
+                   "symbols": [{"exchange": s["exchange"], "trading_symbol": s["trading_symbol"],
+                                "symbol_token": s["symbol_token"]} for s in symbols],
+                   "versions": versions, "results": results}, f)
+    os.replace(tmp, path)
+
+
+_saved = {}             # path -> (mtime, data)
+
+
+def load_results(list_name, kind, interval):
+    """The last persisted scan of a list, re-read only when the file changes."""
+    path = _results_path(list_name, kind, interval)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _saved.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except ValueError:
+        return None
+    _saved[path] = (mtime, data)
+    return data
+
+
+def read_worker_status():
+    """Progress and last-run status written by scan_worker."""
+    try:
+        with open(WORKER_STATUS_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"state": "never_run"}
+
+
+def watchlist_stamp():
+    """mtime (ns) of the watchlist stamp: moves whenever any process changes a list."""
+    try:
+        return os.stat(WATCHLIST_STAMP_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def touch_watchlist_stamp():
+    """Tell every process (the API, the scanner, the worker) that cached watchlists are out of date."""
+    os.makedirs(SCAN_RESULTS_DIR, exist_ok=True)
+    stamp = max(time.time_ns(), watchlist_stamp() + 1)
+    with open(WATCHLIST_STAMP_FILE, "a"):
+        pass
+    os.utime(WATCHLIST_STAMP_FILE, ns=(stamp, stamp))
@@ -0,0 +1,146 @@
+"""Scheduled scan worker: keeps every saved list's Shooting Star scan precomputed.
+
+Runs each weekday at the SCAN_TIMES (IST), by default just after the daily bar
+closes and again before the open. It can also repeat every
+SCAN_INTRADAY_MINUTES while the market is open, which is mostly useful with
+intraday entries in SCAN_WORKER_INTERVALS. A run loads candles for every
+list through the normal loader, so the store and watermarks are warm. It then
+persists each list's results with their series versions for
+/api/shooting_star to adopt, and writes progress to a status file that the
+scanner serves at /api/scan_worker.
+
+    python scan_worker.py           # run on schedule
+    python scan_worker.py --once    # one run now, then exit
+"""
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+import datetime as dt
+
+from candle_store import IST, market_open
+from session_manager import ensure_session
+from scan_cache import SCAN_RESULTS_DIR, WORKER_STATUS_FILE, save_results, read_worker_status
+from shooting_star import (scan_symbol, get_watchlist, invalidate_watchlist, saved_lists, scan_cache,
+                           INTERVAL, SCAN_INTERVALS, MAX_WORKERS)
+
+SCAN_TIMES = [dt.time(*map(int, t.split(":"))) for t in os.getenv("SCAN_TIMES", "08:45,15:35").split(",") if t]
+SCAN_INTRADAY_MINUTES = int(os.getenv("SCAN_INTRADAY_MINUTES", "0"))
+SCAN_WORKER_INTERVALS = [i for i in os.getenv("SCAN_WORKER_INTERVALS", INTERVAL).upper().split(",") if i in SCAN_INTERVALS]
+STATUS_WRITE_INTERVAL = 1.0
+
+
+def next_run(now=None):
+    """Next scheduled run after `now` (IST, weekdays only)."""
+    now = (now or dt.datetime.now(IST)).astimezone(IST)
+    run_at = None
+    for day in range(8):
+        date = now.date() + dt.timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        upcoming = [run for run in (dt.datetime.combine(date, t, IST) for t in SCAN_TIMES) if run > now]
+        if upcoming:
+            run_at = min(upcoming)
+            break
+    if SCAN_INTRADAY_MINUTES and market_open(now):
+        intraday = now + dt.timedelta(minutes=SCAN_INTRADAY_MINUTES)
+        run_at = min(run_at, intraday) if run_at else intraday
+    return run_at
+
+
+class Worker:
+
+    def __init__(self):
+        self.status = read_worker_status()
+        self.status.setdefault("runs", 0)
+        self._written = 0.0
+        self._lock = threading.Lock()
+
+    def _write_status(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._written < STATUS_WRITE_INTERVAL:
+            return
+        self._written = now
+        os.makedirs(SCAN_RESULTS_DIR, exist_ok=True)
+        tmp = f"{WORKER_STATUS_FILE}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.status, f)
+        os.replace(tmp, WORKER_STATUS_FILE)
+
+    def run_once(self):
+        """Scan every saved list and persist the results."""
+        started = time.time()
+        self.status.update({"state": "running", "started_at": started, "finished_at": None,
+                            "error": None, "lists": {}})
+        self._write_status(force=True)
+        try:
+            if not ensure_session():
+                raise RuntimeError("SmartAPI authentication failed")
+            invalidate_watchlist()
+            for list_name in saved_lists():
+                for interval in SCAN_WORKER_INTERVALS:
+                    self._scan_list(list_name, interval)
+            self.status["state"] = "idle"
+        except Exception as e:
+            print("Scan worker error:", str(e))
+            self.status.update({"state": "failed", "error": str(e)})
+        finally:
+            self.status["finished_at"] = time.time()
+            self.status["duration"] = round(self.status["finished_at"] - started, 3)
+            self.status["runs"] += 1
+            self._write_status(force=True)
+
+    def _scan_list(self, list_name, interval):
+        symbols = get_watchlist(list_name)
+        progress = {"done": 0, "total": len(symbols), "eligible": 0}
+        self.status["lists"][list_name if interval == INTERVAL else f"{list_name}@{interval}"] = progress
+
+        def compute(s):
+            result = scan_symbol(s["exchange"], s["trading_symbol"], s["symbol_token"], interval)
+            with self._lock:
+                progress["done"] += 1
+                self._write_status()
+            return result
+
+        results, versions = scan_cache.scan("shooting_star", symbols, interval, compute, MAX_WORKERS)
+        progress["done"] = len(symbols)
+        progress["eligible"] = sum(1 for r in results if r.get("eligible"))
+        save_results(list_name, "shooting_star", interval, symbols, versions, results, time.time())
+        self._write_status(force=True)
+
+    def run_forever(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            run_at = next_run()
+            self.status["next_run_at"] = run_at.isoformat() if run_at else None
+            self._write_status(force=True)
+            if run_at is None:
+                return
+            if stop.wait(max(0.0, (run_at - dt.datetime.now(IST)).total_seconds())):
+                return
+            self.run_once()
+
+
+def start_scheduler():
+    """Run the schedule on a daemon thread inside the current process."""
+    stop = threading.Event()
+    threading.Thread(target=Worker().run_forever, args=(stop,), daemon=True, name="scan-worker").start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute Shooting Star scans for every saved list.")
+    parser.add_argument("--once", action="store_true", help="run one scan now and exit")
+    args = parser.parse_args()
+    worker = Worker()
+    if args.once:
+        worker.run_once()
+        print(json.dumps(worker.status, indent=2))
+    else:
+        worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Production entry point: main.py and shooting_star.py in one process under uvicorn.
+
+The Flask apps run behind a2wsgi's WSGI adapter, which closes each response
+iterable as PEP 3333 requires.
+
+A dispatcher sends each request to the app whose routes match it. main.py is
+checked first, so the routes both apps define (/api/session,
+/api/rate_limits, /metrics) come from it. In one process those report the
+same objects anyway: one SmartAPI login, one rate limiter, one watchlist,
+candle and scan cache, and one database pool. That sharing is why this runs
+a single process with a thread pool (SERVE_THREADS) rather than several
+worker processes, which would each log in and pace the broker separately.
+
+The server listens on every port in SERVE_PORTS (5000 and 5005 by default,
+the ports the dev servers used), so the frontend works unchanged. It
+accepts connections at once. The SmartAPI login, the instrument index and,
+with LIVE_FEED=1, the live feed warm up on a background thread. With
+SERVE_SCAN_WORKER=1 the scheduled scan worker runs in-process too.
+
+On SIGINT/SIGTERM it stops accepting and gives in-flight requests up to
+SERVE_GRACEFUL_SECONDS to finish. Then it stops the live feed and the scan
+worker and closes the database pool.
+
+    python serve.py
+    python serve.py --host 0.0.0.0 --ports 8000 --threads 128
+"""
+import os
+import sys
+import signal
+import socket
+import argparse
+import threading
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from werkzeug.exceptions import HTTPException, NotFound
+
+import database
+import main
+import shooting_star
+from instruments import get_index
+from session_manager import ensure_session
+from scan_worker import start_scheduler
+
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORTS = [int(p) for p in os.getenv("SERVE_PORTS", "5000,5005").split(",") if p]
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "64"))
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", "2048"))     # a 1,000-request burst queues in the kernel, not refused
+SERVE_GRACEFUL_SECONDS = int(os.getenv("SERVE_GRACEFUL_SECONDS", "30"))
+SERVE_SCAN_WORKER = os.getenv("SERVE_SCAN_WORKER", "0") == "1"
+
+
+class Dispatcher:
+    """WSGI app that hands each request to the first Flask app with a matching route."""
+
+    def __init__(self, *apps):
+        self.apps = apps
+
+    def app_for(self, environ):
+        for app in self.apps[:-1]:
+            try:
+                app.url_map.bind_to_environ(environ).match()
+            except NotFound:
+                continue
+            except HTTPException:
+                pass        # wrong method or a trailing-slash redirect: still this app's route
+            return app
+        return self.apps[-1]
+
+    def __call__(self, environ, start_response):
+        return self.app_for(environ)(environ, start_response)
+
+
+app = Dispatcher(main.app, shooting_star.app)
+
+
+def bind(host, port, backlog):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def warm_up():
+    """Log in and load shared state without holding up the listening sockets."""
+    try:
+        if not ensure_session():
+            print("Warm-up: SmartAPI login failed; requests will retry it")
+        get_index()
+        if main.LIVE_FEED:
+            main.start_live_feed()
+    except Exception as e:
+        print("Warm-up error:", str(e))
+
+
+def _exit(signum, frame):
+    sys.exit(0)
+
+
+def serve(host=SERVE_HOST, ports=SERVE_PORTS, threads=SERVE_THREADS, backlog=SERVE_BACKLOG,
+          graceful=SERVE_GRACEFUL_SECONDS, scan_worker=SERVE_SCAN_WORKER, log_level="info"):
+    config = uvicorn.Config(WSGIMiddleware(app, workers=threads), host=host, port=ports[0], lifespan="off",
+                            backlog=backlog, timeout_graceful_shutdown=graceful, log_level=log_level)
+    server = uvicorn.Server(config)
+    sockets = [bind(host, port, backlog) for port in ports]
+    threading.Thread(target=warm_up, daemon=True, name="warm-up").start()
+    scheduler = start_scheduler() if scan_worker else None
+    if threading.current_thread() is threading.main_thread():
+        # uvicorn re-raises the signal it shut down on; exit through the cleanup below instead of dying
+        signal.signal(signal.SIGTERM, _exit)
+    try:
+        server.run(sockets=sockets)     # returns after a graceful shutdown on SIGINT/SIGTERM
+    finally:
+        if scheduler:
+            scheduler.set()
+        if main.LIVE_FEED:
+            main.feed.stop()
+        database.engine.dispose()
+        for sock in sockets:
+            sock.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Serve the API and the scanner from one process.")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--ports", default=",".join(map(str, SERVE_PORTS)), help="comma separated")
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help="request threads")
+    parser.add_argument("--backlog", type=int, default=SERVE_BACKLOG)
+    parser.add_argument("--graceful", type=int, default=SERVE_GRACEFUL_SECONDS,
+                        help="seconds in-flight requests get on shutdown")
+    parser.add_argument("--scan-worker", action="store_true", default=SERVE_SCAN_WORKER,
+                        help="run the scheduled scan worker in-process")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.host, [int(p) for p in args.ports.split(",") if p], args.threads, args.backlog,
+          args.graceful, args.scan_worker, args.log_level)
+
+
+if __name__ == "__main__":
+    main_cli()
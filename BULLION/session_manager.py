@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import base64
+import threading
+import pyotp
+from SmartApi import SmartConnect
+from dotenv import load_dotenv
+from metrics import LOGIN_SECONDS, observe
+
+load_dotenv()
+
+# ---------------- CONFIG ----------------
+API_KEY = os.getenv("SMART_API_KEY")
+CLIENT_ID = os.getenv("SMART_API_CLIENT_ID")
+PIN = os.getenv("SMART_PIN")
+TOTP_SECRET = os.getenv("SMART_TOTP_SECRET")
+SMART_API_ROOT = os.getenv("SMART_API_ROOT")                          # e.g. a fake_smartapi server
+
+SESSION_TTL = int(os.getenv("SMART_SESSION_TTL", "21600"))            # used when the JWT has no exp claim
+SESSION_REFRESH_MARGIN = int(os.getenv("SMART_SESSION_REFRESH_MARGIN", "300"))
+LOGIN_RETRY_COOLDOWN = float(os.getenv("SMART_LOGIN_RETRY_COOLDOWN", "5"))
+LOGIN_MIN_INTERVAL = float(os.getenv("SMART_LOGIN_MIN_INTERVAL", "1.0"))   # SmartAPI allows one login per second
+
+# SmartAPI error codes that mean the JWT is no longer accepted
+AUTH_ERROR_CODES = {"AG8001", "AG8002", "AG8003", "AB8050", "AB8051", "AB1010", "AB1011"}
+
+
+def jwt_expiry(jwt_token):
+    """Read the exp claim (epoch seconds) from a JWT without verifying it."""
+    try:
+        token = jwt_token.split(" ")[-1]
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload)).get("exp"))
+    except Exception:
+        return None
+
+
+def is_auth_error(resp):
+    """True if a SmartAPI response (or raised exception) signals an invalid session."""
+    if isinstance(resp, Exception):
+        return type(resp).__name__ == "TokenException" or getattr(resp, "code", None) in (401, 403)
+    if isinstance(resp, dict) and resp.get("status") is False:
+        return resp.get("errorcode") in AUTH_ERROR_CODES
+    return False
+
+
+class SessionManager:
+    """Caches one SmartAPI login and shares it across threads and Flask apps."""
+
+    def __init__(self, smart_api, client_id, pin, totp_secret,
+                 ttl=SESSION_TTL, refresh_margin=SESSION_REFRESH_MARGIN):
+        self.smart_api = smart_api
+        self.client_id = client_id
+        self.pin = pin
+        self.totp_secret = totp_secret
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+
+        self.jwt_token = None
+        self.feed_token = None
+        self.expires_at = 0.0
+        self._last_failure = 0.0
+        self._last_attempt = None       # monotonic time the last login request returned
+        self._lock = threading.Lock()
+
+        self.login_count = 0
+        self.login_failures = 0
+        self.login_latency_total = 0.0
+        self.login_latency_last = 0.0
+
+    def is_valid(self):
+        return bool(self.jwt_token) and time.time() < self.expires_at - self.refresh_margin
+
+    def ensure(self):
+        """Return True once a usable session exists, logging in only when needed."""
+        if self.is_valid():
+            return True
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self.is_valid():
+                return True
+            # Don't hammer the login endpoint after a failure
+            if time.time() - self._last_failure < LOGIN_RETRY_COOLDOWN:
+                return False
+            return self._login()
+
+    def invalidate(self, jwt_token=None):
+        """Drop the cached session, e.g. after the broker rejected the token.
+
+        Passing the token that failed avoids discarding a session another
+        thread has already refreshed.
+        """
+        with self._lock:
+            if jwt_token is None or jwt_token == self.jwt_token:
+                self.jwt_token = None
+                self.expires_at = 0.0
+
+    def call(self, fn, *args, **kwargs):
+        """Run a SmartAPI call, re-logging in once if the session was rejected."""
+        if not self.ensure():
+            raise RuntimeError("SmartAPI authentication failed")
+        token = self.jwt_token
+        try:
+            resp = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            resp = e
+        if not is_auth_error(resp):
+            return resp
+
+        self.invalidate(token)
+        if not self.ensure():
+            raise RuntimeError("SmartAPI authentication failed")
+        return fn(*args, **kwargs)
+
+    def _login(self):
+        # A re-login right after a login (an auth error on the first call) would be throttled.
+        # Counted from when the last login returned, so the broker sees them a full interval apart.
+        if self._last_attempt is not None:
+            wait = self._last_attempt + LOGIN_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        start = time.perf_counter()
+        jwt_token = None
+        try:
+            totp = pyotp.TOTP(self.totp_secret).now()
+            data = self.smart_api.generateSession(self.client_id, self.pin, totp)
+            jwt_token = (data or {}).get("data", {}).get("jwtToken") if isinstance(data, dict) else None
+        except Exception as e:
+            print("Session error:", e)
+            jwt_token = None
+        finally:
+            self._last_attempt = time.monotonic()
+            elapsed = time.perf_counter() - start
+            self.login_count += 1
+            self.login_latency_total += elapsed
+            self.login_latency_last = elapsed
+            observe(LOGIN_SECONDS, elapsed, "login", outcome="ok" if jwt_token else "failed")
+
+        if not jwt_token:
+            self.login_failures += 1
+            self._last_failure = time.time()
+            return False
+
+        now = time.time()
+        self.jwt_token = jwt_token
+        self.feed_token = data["data"].get("feedToken")
+        self.expires_at = jwt_expiry(jwt_token) or (now + self.ttl)
+        return True
+
+    def metrics(self):
+        return {
+            "logins": self.login_count,
+            "login_failures": self.login_failures,
+            "login_latency_last_ms": round(self.login_latency_last * 1000, 2),
+            "login_latency_avg_ms": round(self.login_latency_total * 1000 / self.login_count, 2) if self.login_count else 0.0,
+            "session_valid": self.is_valid(),
+            "expires_in": max(0, int(self.expires_at - time.time())) if self.jwt_token else 0,
+        }
+
+
+smartApi = SmartConnect(API_KEY, root=SMART_API_ROOT)
+session = SessionManager(smartApi, CLIENT_ID, PIN, TOTP_SECRET)
+
+
+def ensure_session() -> bool:
+    """Make sure the shared SmartAPI session is logged in."""
+    return session.ensure()
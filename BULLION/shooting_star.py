@@ -1,67 +1,108 @@
 import os
+import json
 import time
 import datetime as dt
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import pyotp
-from SmartApi import SmartConnect
-import mysql.connector
+import threading
+from sqlalchemy import text
+import database
+from session_manager import smartApi, session, ensure_session
+from candle_loader import load_candles
+from candle_store import INTERVAL_SECONDS
+from candle_series import CandleSeries
+from resample import BASE_INTERVAL, RESAMPLED
+from rate_limiter import limiter
+from instruments import lookup_token
+from async_scan import stream_scan
+from patterns import PATTERNS, register_pattern, evaluate_patterns, bars_needed
+from metrics import install, timed, STAGE_SECONDS, registry
+import compression
+from strategy import ENTRY_BUFFER, RISK_REWARD, INTERVAL
+from scan_cache import (ScanCache, list_etag, last_modified, load_results, read_worker_status,
+                        watchlist_stamp, touch_watchlist_stamp)
 
 # ---------------- CONFIG ----------------
 DEFAULT_LIST_NAME = "bull"
 LOOKBACK_DAYS = 30
-ENTRY_BUFFER = 0.001
-RISK_REWARD = 2.0
-MAX_WORKERS = 3  # Reduce to avoid API rate limit
+MAX_WORKERS = int(os.getenv("SCAN_MAX_WORKERS", "16"))  # broker throughput is paced by rate_limiter
 
-API_KEY = os.getenv("SMART_API_KEY")
-CLIENT_ID = os.getenv("SMART_API_CLIENT_ID")
-PIN = os.getenv("SMART_PIN")
-TOTP_SECRET = os.getenv("SMART_TOTP_SECRET")
+WATCHLIST_TTL = float(os.getenv("WATCHLIST_CACHE_TTL", "60"))
 
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME")
-
-INTERVAL = "ONE_DAY"
+SCAN_INTERVALS = [INTERVAL, BASE_INTERVAL, *RESAMPLED]   # intraday ones are built from BASE_INTERVAL bars
+SESSION_MINUTES = 375                                    # NSE 09:15-15:30
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["ETag", "Last-Modified", "X-Request-ID"])
+install(app, "scanner")
+compression.install(app)
 
-smartApi = SmartConnect(API_KEY)
+scan_cache = ScanCache()
+registry.gauge("bullion_scan_cache_entries", "Cached per-symbol scan results.", (),
+               lambda: {(): scan_cache.metrics()["entries"]})
 
-def ensure_session():
-    """Check and create valid SmartAPI session."""
-    try:
-        totp = pyotp.TOTP(TOTP_SECRET).now()
-        data = smartApi.generateSession(CLIENT_ID, PIN, totp)
-        return bool(data and data.get("data", {}).get("jwtToken"))
-    except Exception as e:
-        print("Auth error:", e)
-        return False
+_watchlists = {}            # list_name -> (loaded_at, stamp, rows)
+_watchlists_lock = threading.Lock()
 
 def get_watchlist(list_name=DEFAULT_LIST_NAME):
-    """Fetch all stocks from DB for given list_name."""
-    cnx = mysql.connector.connect(
-        host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-    )
-    try:
-        cur = cnx.cursor(dictionary=True)
-        cur.execute(
-            "SELECT exchange, trading_symbol, symbol_token FROM stocks WHERE list_name = %s",
-            (list_name,)
-        )
-        return cur.fetchall()
-    finally:
-        cnx.close()
+    """Fetch all stocks from DB for given list_name.
+
+    Cached for WATCHLIST_TTL seconds, or until any process changes a list
+    and moves the watchlist stamp.
+    """
+    stamp = watchlist_stamp()       # read before the query, so a change made meanwhile is seen next time
+    cached = _watchlists.get(list_name)
+    if cached and cached[1] == stamp and time.monotonic() - cached[0] < WATCHLIST_TTL:
+        return list(cached[2])
+    with database.engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT exchange, trading_symbol, symbol_token FROM stocks WHERE list_name = :ln"),
+            {"ln": list_name}
+        ).mappings().all()
+    rows = [dict(r) for r in rows]
+    with _watchlists_lock:
+        _watchlists[list_name] = (time.monotonic(), stamp, rows)
+    return list(rows)
+
+def saved_lists():
+    with database.engine.connect() as conn:
+        return [r.list_name for r in conn.execute(text("SELECT list_name FROM lists ORDER BY list_name"))]
+
+def dedupe_watchlists(watchlists):
+    """Unique rows across {list_name: rows}, keyed by (exchange, token) or, without a token, by symbol.
+
+    Returns (unique rows, the lists each unique row is in, {list_name: unique index of each of its rows}).
+    """
+    unique, members, slots, index = [], [], {}, {}
+    for list_name, rows in watchlists.items():
+        slots[list_name] = []
+        for s in rows:
+            key = (s["exchange"].upper(), str(s["symbol_token"]) if s.get("symbol_token") else "sym:" + s["trading_symbol"])
+            i = index.get(key)
+            if i is None:
+                i = index[key] = len(unique)
+                unique.append(s)
+                members.append([])
+            if list_name not in members[i]:
+                members[i].append(list_name)
+            slots[list_name].append(i)
+    return unique, members, slots
+
+def invalidate_watchlist(list_name=None):
+    """Drop one cached watchlist, or all of them, here and in every other process."""
+    with _watchlists_lock:
+        if list_name is None:
+            _watchlists.clear()
+        else:
+            _watchlists.pop(list_name, None)
+    touch_watchlist_stamp()
 
 def is_uptrend(candles):
     """Check if last 5 closes show uptrend."""
     if len(candles) < 5:
         return False
-    closes = [c["close"] for c in candles[-5:]]
+    tail = candles[-5:]
+    closes = tail.close.tolist() if isinstance(tail, CandleSeries) else [c["close"] for c in tail]
     return all(closes[i] > closes[i-1] for i in range(1, 5))
 
 def is_shooting_star(candle):
@@ -84,43 +125,45 @@ def compute_levels(low, high):
 def get_symboltoken(exchange, trading_symbol, token_from_db=None):
     if token_from_db:
         return token_from_db
+    token = lookup_token(exchange, trading_symbol)
+    if token:
+        return token
     try:
-        sr = smartApi.searchScrip(exchange, trading_symbol)
+        sr = limiter.call("searchScrip", session.call, smartApi.searchScrip, exchange, trading_symbol)
         data = (sr or {}).get("data") or []
         for s in data:
-            if s.get("trading_symbol") == trading_symbol:
+            if s.get("tradingsymbol") == trading_symbol:
                 return s.get("symboltoken")
     except Exception as e:
         print(f"Token fetch error for {trading_symbol}: {e}")
     return None
 
-def get_daily_candles(exchange, token, days=LOOKBACK_DAYS):
-    """Fetch historical daily candles with rate-limit handling."""
+def lookback_range(days=LOOKBACK_DAYS):
+    to_dt = dt.datetime.now()
+    return to_dt - dt.timedelta(days=days + 5), to_dt
+
+def get_candles(exchange, token, days=LOOKBACK_DAYS, interval=INTERVAL):
+    """Candles for the lookback window; only bars newer than the watermark hit the broker."""
     try:
-        to_dt = dt.datetime.now()
-        from_dt = to_dt - dt.timedelta(days=days + 5)
-        payload = {
-            "exchange": exchange,
-            "symboltoken": str(token),
-            "interval": INTERVAL,
-            "fromdate": from_dt.strftime("%Y-%m-%d %H:%M"),
-            "todate": to_dt.strftime("%Y-%m-%d %H:%M"),
-        }
-        time.sleep(0.5)
-        candles = smartApi.getCandleData(payload)
-        data = (candles or {}).get("data") or []
-        return [{"time": r[0], "open": float(r[1]), "high": float(r[2]),
-                 "low": float(r[3]), "close": float(r[4]), "volume": float(r[5])} for r in data]
+        from_dt, to_dt = lookback_range(days)
+        return load_candles(exchange, token, from_dt, to_dt, interval)
     except Exception as e:
         print(f"Candle fetch error for token {token}: {e}")
         return []
 
-def scan_symbol(exchange, trading_symbol, token_from_db=None):
-    token = get_symboltoken(exchange, trading_symbol, token_from_db)
+def scan_symbol(exchange, trading_symbol, token_from_db=None, interval=INTERVAL):
+    with timed(STAGE_SECONDS, stage="token_lookup"):
+        token = get_symboltoken(exchange, trading_symbol, token_from_db)
     if not token:
         return {"symbol": trading_symbol, "eligible": False, "reason": "token_not_found"}
-    
-    candles = get_daily_candles(exchange, token)
+
+    with timed(STAGE_SECONDS, stage="candle_fetch"):
+        candles = get_candles(exchange, token, lookback_days_for(10, interval), interval)
+    with timed(STAGE_SECONDS, stage="analysis"):
+        return analyze_candles(trading_symbol, candles)
+
+def analyze_candles(trading_symbol, candles):
+    """Shooting Star decision for an already fetched CandleSeries (or candle dict list)."""
     if len(candles) < 10:
         return {"symbol": trading_symbol, "eligible": False, "reason": "not_enough_candles"}
 
@@ -144,26 +187,132 @@ def scan_symbol(exchange, trading_symbol, token_from_db=None):
         "target": target
     }
 
-@app.route("/api/shooting_star", methods=["POST"])
-def api_shooting_star():
+@register_pattern("shooting_star", bars=10, label="Shooting Star")
+def detect_shooting_star(bars):
+    candles = bars.candles
+    last_candle = candles[-1]
+    if not is_uptrend(candles[:-1][-6:]) or not is_shooting_star(last_candle):
+        return {"signal": False}
+    entry, stop, target = compute_levels(last_candle["low"], last_candle["high"])
+    return {"signal": True, "entry_sell": entry, "stop_loss": stop, "target": target}
+
+def lookback_days_for(bars, interval=INTERVAL):
+    """Calendar days that comfortably hold `bars` bars of `interval` (weekends + holidays)."""
+    if interval == INTERVAL:
+        return max(LOOKBACK_DAYS, bars * 3 // 2 + 10)
+    per_day = -(-SESSION_MINUTES * 60 // INTERVAL_SECONDS[interval])
+    return -(-bars // per_day) * 3 // 2 + 4
+
+def scan_patterns(exchange, trading_symbol, token_from_db, names, days, interval=INTERVAL):
+    with timed(STAGE_SECONDS, stage="token_lookup"):
+        token = get_symboltoken(exchange, trading_symbol, token_from_db)
+    if not token:
+        return {"symbol": trading_symbol, "eligible": False, "reason": "token_not_found"}
+    with timed(STAGE_SECONDS, stage="candle_fetch"):
+        candles = get_candles(exchange, token, days, interval)
+    with timed(STAGE_SECONDS, stage="analysis"):
+        return evaluate_patterns(trading_symbol, candles, names)
+
+def not_modified(etag, modified):
+    """True when the request's validators show the client already holds this scan."""
+    if etag is None:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if modified and request.if_modified_since:
+        return modified <= request.if_modified_since
+    return False
+
+def with_validators(resp, etag, modified):
+    if etag:
+        resp.set_etag(etag)
+    if modified:
+        resp.last_modified = modified
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+def request_data():
+    """JSON body (POST) or query string (GET)."""
+    if request.method == "POST":
+        return request.get_json(force=True, silent=True) or {}
+    return request.args
+
+def requested_interval(data):
+    interval = (data.get("interval") or INTERVAL).upper()
+    return interval if interval in SCAN_INTERVALS else None
+
+@app.route("/api/patterns", methods=["GET"])
+def api_patterns():
+    return jsonify([{"name": p.name, "label": p.label, "bars": p.bars} for p in PATTERNS.values()])
+
+@app.route("/api/scan", methods=["POST"])
+def api_scan():
+    """Evaluate several registered patterns per symbol over one candle fetch."""
     data = request.get_json(force=True) or {}
     list_name = data.get("list") or DEFAULT_LIST_NAME
+    names = list(dict.fromkeys(data.get("patterns") or ["shooting_star"]))
+    interval = requested_interval(data)
+
+    unknown = [n for n in names if n not in PATTERNS]
+    if unknown:
+        return jsonify({"error": f"Unknown patterns: {', '.join(unknown)}"}), 400
+    if not interval:
+        return jsonify({"error": f"interval must be one of {', '.join(SCAN_INTERVALS)}"}), 400
 
-    if not ensure_session():
+    kind = "scan:" + ",".join(names)
+    symbols = get_watchlist(list_name)
+    versions = scan_cache.versions(symbols, interval)
+    etag, modified = list_etag(list_name, kind, interval, symbols, versions), last_modified(versions)
+    if not_modified(etag, modified):
+        return with_validators(Response(status=304), etag, modified)
+
+    if None in versions and not ensure_session():
         return jsonify({"error": "Auth failed"}), 401
 
+    days = lookback_days_for(bars_needed(names), interval)
+    results, versions = scan_cache.scan(
+        kind, symbols, interval,
+        lambda s: scan_patterns(s["exchange"], s["trading_symbol"], s["symbol_token"], names, days, interval),
+        MAX_WORKERS)
+
+    matched = {n: [r["symbol"] for r in results if r.get("patterns", {}).get(n, {}).get("signal")] for n in names}
+    resp = jsonify({
+        "results": results,
+        "matched": matched,
+        "count": {
+            "eligible": sum(1 for r in results if r.get("eligible")),
+            "total": len(results)
+        }
+    })
+    return with_validators(resp, list_etag(list_name, kind, interval, symbols, versions), last_modified(versions))
+
+@app.route("/api/shooting_star", methods=["GET", "POST"])
+def api_shooting_star():
+    data = request_data()
+    list_name = data.get("list") or DEFAULT_LIST_NAME
+    interval = requested_interval(data)
+    if not interval:
+        return jsonify({"error": f"interval must be one of {', '.join(SCAN_INTERVALS)}"}), 400
+
     symbols = get_watchlist(list_name)
-    results = []
+    scan_cache.seed("shooting_star", symbols, interval, load_results(list_name, "shooting_star", interval))
+    versions = scan_cache.versions(symbols, interval)
+    etag, modified = list_etag(list_name, "shooting_star", interval, symbols, versions), last_modified(versions)
+    if not_modified(etag, modified):
+        return with_validators(Response(status=304), etag, modified)
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(scan_symbol, s["exchange"], s["trading_symbol"], s["symbol_token"]) for s in symbols]
-        for fut in as_completed(futures):
-            results.append(fut.result())
+    if None in versions and not ensure_session():
+        return jsonify({"error": "Auth failed"}), 401
+
+    results, versions = scan_cache.scan(
+        "shooting_star", symbols, interval,
+        lambda s: scan_symbol(s["exchange"], s["trading_symbol"], s["symbol_token"], interval),
+        MAX_WORKERS)
 
     eligible = [r for r in results if r.get("eligible")]
     rejected = [r for r in results if not r.get("eligible")]
 
-    return jsonify({
+    resp = jsonify({
         "eligible": eligible,
         "rejected": rejected,
         "count": {
@@ -172,6 +321,125 @@ def api_shooting_star():
             "total": len(results)
         }
     })
+    return with_validators(resp, list_etag(list_name, "shooting_star", interval, symbols, versions),
+                           last_modified(versions))
+
+@app.route("/api/shooting_star/stream", methods=["POST"])
+def api_shooting_star_stream():
+    """Same scan as /api/shooting_star, streamed as NDJSON: one line per symbol, then a summary.
+
+    Cached results are sent first; only symbols whose candles moved are rescanned.
+    The summary line carries the ETag, since it is only known once the scan ends.
+    """
+    data = request.get_json(force=True) or {}
+    list_name = data.get("list") or DEFAULT_LIST_NAME
+    interval = requested_interval(data)
+    if not interval:
+        return jsonify({"error": f"interval must be one of {', '.join(SCAN_INTERVALS)}"}), 400
+
+    symbols = get_watchlist(list_name)
+    scan_cache.seed("shooting_star", symbols, interval, load_results(list_name, "shooting_star", interval))
+    cached, versions, stale = scan_cache.split("shooting_star", symbols, interval)
+    etag, modified = list_etag(list_name, "shooting_star", interval, symbols, versions), last_modified(versions)
+    if not_modified(etag, modified):
+        return with_validators(Response(status=304), etag, modified)
+
+    if stale and not ensure_session():
+        return jsonify({"error": "Auth failed"}), 401
+
+    from_dt, to_dt = lookback_range(lookback_days_for(10, interval))
+
+    def generate():
+        count = {"eligible": 0, "rejected": 0, "total": 0}
+
+        def emit(result):
+            count["eligible" if result.get("eligible") else "rejected"] += 1
+            count["total"] += 1
+            return json.dumps(result) + "\n"
+
+        for result in cached:
+            if result is not None:
+                yield emit(result)
+        for j, result in stream_scan([symbols[i] for i in stale], analyze_candles, from_dt, to_dt, interval):
+            i = stale[j]
+            versions[i] = scan_cache.put("shooting_star", symbols[i], interval, result)
+            yield emit(result)
+        yield json.dumps({"done": True, "count": count,
+                          "etag": list_etag(list_name, "shooting_star", interval, symbols, versions)}) + "\n"
+
+    resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    return with_validators(resp, etag if not stale else None, modified if not stale else None)
+
+@app.route("/api/shooting_star/batch", methods=["POST"])
+def api_shooting_star_batch():
+    """Shooting Star scan of many lists (or "all"), streamed as NDJSON.
+
+    Symbols shared by several lists are fetched and analyzed once. Each line is
+    one symbol's result plus the lists it belongs to; the summary line has every
+    list's counts and ETag, valid for /api/shooting_star on that list.
+    """
+    data = request.get_json(force=True) or {}
+    lists = data.get("lists") or [DEFAULT_LIST_NAME]
+    list_names = saved_lists() if lists == "all" else list(dict.fromkeys(lists if isinstance(lists, list) else [lists]))
+    interval = requested_interval(data)
+    if not interval:
+        return jsonify({"error": f"interval must be one of {', '.join(SCAN_INTERVALS)}"}), 400
+
+    watchlists = {name: get_watchlist(name) for name in list_names}
+    for name, rows in watchlists.items():
+        scan_cache.seed("shooting_star", rows, interval, load_results(name, "shooting_star", interval))
+    symbols, members, slots = dedupe_watchlists(watchlists)
+    cached, versions, stale = scan_cache.split("shooting_star", symbols, interval)
+
+    if stale and not ensure_session():
+        return jsonify({"error": "Auth failed"}), 401
+
+    from_dt, to_dt = lookback_range(lookback_days_for(10, interval))
+
+    def generate():
+        counts = {name: {"eligible": 0, "rejected": 0, "total": 0} for name in list_names}
+
+        def emit(i, result):
+            for name in members[i]:
+                counts[name]["eligible" if result.get("eligible") else "rejected"] += 1
+                counts[name]["total"] += 1
+            return json.dumps({**result, "lists": members[i]}) + "\n"
+
+        for i, result in enumerate(cached):
+            if result is not None:
+                yield emit(i, result)
+        for j, result in stream_scan([symbols[i] for i in stale], analyze_candles, from_dt, to_dt, interval):
+            i = stale[j]
+            versions[i] = scan_cache.put("shooting_star", symbols[i], interval, result)
+            yield emit(i, result)
+
+        summary = {name: {"count": counts[name],
+                          "etag": list_etag(name, "shooting_star", interval, rows, [versions[i] for i in slots[name]])}
+                   for name, rows in watchlists.items()}
+        yield json.dumps({"done": True, "lists": summary,
+                          "symbols": {"unique": len(symbols), "listed": sum(len(r) for r in watchlists.values()),
+                                      "scanned": len(stale)}}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/api/session", methods=["GET"])
+def session_status():
+    """Login count/latency for the shared SmartAPI session."""
+    return jsonify(session.metrics())
+
+@app.route("/api/rate_limits", methods=["GET"])
+def rate_limit_status():
+    """Current per-endpoint broker rates and queue depth."""
+    return jsonify(limiter.metrics())
+
+@app.route("/api/scan_cache", methods=["GET"])
+def scan_cache_status():
+    return jsonify(scan_cache.metrics())
+
+@app.route("/api/scan_worker", methods=["GET"])
+def scan_worker_status():
+    """Progress of the running scheduled scan, or how the last one ended."""
+    return jsonify(read_worker_status())
 
 if __name__ == "__main__":
     app.run(debug=True, port=5005)
@@ -0,0 +1,19 @@
+"""Shooting Star strategy parameters.
+
+Shared by the live scanner (shooting_star.py), the batch engine
+(pattern_engine.py) and the offline tools (backtest.py, param_sweep.py).
+This module imports nothing, so the offline tools can read the defaults
+without building the Flask app, the SmartAPI session or the database engine.
+"""
+
+INTERVAL = "ONE_DAY"
+
+# ---------------- pattern ----------------
+MIN_BARS = 10          # scan_symbol rejects anything shorter
+TREND_BARS = 5         # closes checked by is_uptrend
+UPPER_SHADOW_RATIO = 2.0
+LOWER_SHADOW_RATIO = 0.1
+
+# ---------------- levels ----------------
+ENTRY_BUFFER = 0.001   # sell-stop this fraction below the star's low
+RISK_REWARD = 2.0      # target distance in multiples of the risk
@@ -0,0 +1,38 @@
+"""Run the tests against a throwaway SQLite database, candle store and scan directory,
+and a FakeSmartAPI broker.
+
+The modules are flat and read their settings at import time, so the
+environment is set up here before any test imports them.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+
+benchmark.configure(tempfile.mkdtemp(prefix="bullion-test-"), benchmark.BENCH_RATES)
+
+from fake_smartapi import FakeSmartAPI  # noqa: E402
+
+broker = FakeSmartAPI(0, 0, benchmark.BENCH_RATES, symbols=100)
+benchmark.point_at(broker.start())
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """The app's engine with the lists/stocks/candles tables created."""
+    import database
+    benchmark.create_schema(database.engine)
+    return database.engine
+
+
+@pytest.fixture
+def fake():
+    """The fake broker, with fresh request counts and no injected errors."""
+    broker.reset_stats()
+    yield broker
+    broker.error_rate = broker.auth_error_rate = 0.0
@@ -0,0 +1,52 @@
+"""stream_scan: every symbol when read to the end, and no more broker calls once the reader leaves."""
+import time
+import threading
+import datetime as dt
+
+from async_scan import stream_scan
+from candle_store import IST
+from metrics import STAGE_SECONDS
+
+FROM, TO = dt.datetime(2025, 3, 3, tzinfo=IST), dt.datetime(2025, 6, 13, 23, 59, tzinfo=IST)
+
+
+def rows(first, n):
+    return [{"exchange": "NSE", "trading_symbol": f"S{first + i}-EQ", "symbol_token": str(100000 + first + i)}
+            for i in range(n)]
+
+
+def candle_requests(fake):
+    return fake.stats()["getCandleData"]["requests"]
+
+
+def stage_counts():
+    return {stage: STAGE_SECONDS.count(stage=stage) for stage in ("token_lookup", "candle_fetch", "analysis")}
+
+
+def test_stream_returns_every_symbol(fake):
+    symbols = rows(20, 20)
+    before = stage_counts()
+    results = list(stream_scan(symbols, lambda ts, candles: (ts, len(candles)), FROM, TO, "ONE_DAY", concurrency=4))
+    assert sorted(i for i, _ in results) == list(range(20))
+    assert all(symbols[i]["trading_symbol"] == ts and n > 0 for i, (ts, n) in results)
+    assert candle_requests(fake) == 20
+    assert {k: v - before[k] for k, v in stage_counts().items()} == \
+        {"token_lookup": 20, "candle_fetch": 20, "analysis": 20}
+
+
+def test_closing_the_stream_stops_the_scan(fake, monkeypatch):
+    monkeypatch.setattr(fake, "latency_ms", 20.0)
+    analyzed = []
+    scan = stream_scan(rows(40, 60), lambda ts, candles: analyzed.append(ts), FROM, TO, "ONE_DAY", concurrency=4)
+    next(scan)
+    scan.close()            # what the WSGI server does when the client disconnects
+
+    for t in threading.enumerate():
+        if t.name == "stream-scan":
+            t.join(5)
+            assert not t.is_alive()
+    requests = candle_requests(fake)
+    time.sleep(0.2)
+    assert candle_requests(fake) == requests
+    # one read, up to 4 queued, up to 4 in flight and one waiting to be queued
+    assert requests <= 10 and len(analyzed) <= 10
@@ -0,0 +1,84 @@
+"""Backtest signals and fills on hand-built series, against the live scanner's rules and levels."""
+import numpy as np
+import pytest
+
+from backtest import Signals, signal_mask, simulate
+from pattern_engine import CandleBatch, rounded_level_arrays
+from shooting_star import compute_levels
+
+RISING = [(c - 0.5, c + 0.5, c - 1.0, c) for c in np.arange(100.0, 109.0)]    # closes 100..108
+STAR = (110.0, 116.0, 108.95, 109.0)
+ENTRY, STOP, TARGET = compute_levels(STAR[2], STAR[1])                        # 108.84, 116.0, 94.52
+
+
+def batch(*series):
+    """Right-aligned, NaN-padded CandleBatch of (open, high, low, close) rows."""
+    width = max(len(s) for s in series)
+    cols = np.full((4, len(series), width), np.nan)
+    for i, s in enumerate(series):
+        cols[:, i, width - len(s):] = np.array(s, dtype=float).T
+    times = np.tile(np.arange(width, dtype=np.int64) * 86_400_000, (len(series), 1))
+    return CandleBatch(times, *cols, np.ones_like(cols[0]), np.array([len(s) for s in series]))
+
+
+def trade(*after, entry_bars=3, max_hold=5):
+    """The one trade of RISING + STAR followed by `after` bars."""
+    signals = Signals(batch(RISING + [STAR] + list(after)), entry_bars, max_hold)
+    assert len(signals) == 1
+    trades = simulate(signals)
+    assert trades["filled"] == 1 and len(trades["r"]) == 1
+    return {k: v[0] for k, v in trades.items() if isinstance(v, np.ndarray)}
+
+
+def test_min_bars_as_the_scanner():
+    ten = RISING + [STAR]
+    short = RISING[-5:] + [STAR]                    # uptrend and star, but only 6 bars
+    nine = RISING[1:] + [STAR]
+    mask = signal_mask(batch(ten, short, nine))
+    assert mask.sum(axis=1).tolist() == [1, 0, 0]
+    assert mask[0, -1]
+
+
+def test_levels_match_compute_levels():
+    rng = np.random.default_rng(3)
+    low = np.round(rng.uniform(10, 5000, 2000), 2)
+    high = np.round(low + rng.uniform(0.05, 200, 2000), 2)
+    expected = np.array([compute_levels(l, h) for l, h in zip(low.tolist(), high.tolist())])
+    np.testing.assert_array_equal(np.column_stack(rounded_level_arrays(low, high)), expected)
+
+
+def test_fill_then_target():
+    t = trade((109.0, 109.5, 108.5, 108.6), (100.0, 101.0, 94.0, 95.0))
+    assert t["entry"] == ENTRY and t["outcome"] == "target" and t["exit"] == TARGET
+    assert t["r"] == pytest.approx((ENTRY - TARGET) / (STOP - ENTRY))
+
+
+def test_fill_gapping_through_the_entry_fills_at_the_open():
+    t = trade((107.0, 107.5, 106.0, 106.5), (100.0, 101.0, 94.0, 95.0))
+    assert t["entry"] == 107.0 and t["exit"] == TARGET
+
+
+def test_stop_wins_when_a_bar_touches_both():
+    t = trade((109.0, 109.5, 108.5, 108.6), (108.0, 117.0, 90.0, 100.0))
+    assert t["outcome"] == "stop" and t["exit"] == STOP and t["r"] == pytest.approx(-1.0)
+
+
+def test_gap_through_the_stop_exits_at_the_open():
+    t = trade((109.0, 109.5, 108.5, 108.6), (118.0, 119.0, 117.0, 118.5))
+    assert t["outcome"] == "stop" and t["exit"] == 118.0
+
+
+def test_target_on_the_fill_bar():
+    # filled at the entry and ran through the target on the same bar
+    t = trade((109.0, 109.5, 90.0, 91.0))
+    assert t["entry"] == ENTRY and t["exit"] == TARGET
+    # gapped below the target on the open: closes at the fill price
+    t = trade((93.0, 95.0, 90.0, 91.0))
+    assert t["entry"] == 93.0 and t["exit"] == 93.0 and t["r"] == 0.0
+
+
+def test_timeout_and_unfilled():
+    t = trade((109.0, 109.5, 108.5, 108.6), *[(108.6, 109.0, 108.0, 108.5)] * 4, max_hold=3)
+    assert t["outcome"] == "timeout" and t["exit"] == 108.5
+    signals = Signals(batch(RISING + [STAR] + [(112.0, 113.0, 111.0, 112.5)] * 6), 3, 3)
+    assert simulate(signals)["filled"] == 0
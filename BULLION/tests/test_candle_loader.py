@@ -0,0 +1,150 @@
+"""candle_loader against FakeSmartAPI: which ranges go to the broker, and when the watermark moves.
+
+Windows end in the past, so the broker has every bar in them. A fetch made
+during a past session is simulated by writing its watermark (and bar)
+directly, as another process would.
+"""
+import time
+import datetime as dt
+
+import numpy as np
+import pytest
+
+import candle_loader
+from candle_loader import load_candles, series_version, MAX_DAYS_PER_REQUEST
+from candle_series import CandleSeries
+from candle_store import store, to_millis, IST
+from session_manager import session
+
+DAY_MS = 86_400_000
+
+
+def ist(*args):
+    return dt.datetime(*args, tzinfo=IST)
+
+
+def ms(*args):
+    return to_millis(ist(*args))
+
+
+def weekdays(start, end):
+    return int(np.busday_count(start.date(), end.date() + dt.timedelta(days=1)))
+
+
+@pytest.fixture
+def fetches(fake, monkeypatch):
+    """(start_ms, end_ms) of every getCandleData range the loader asks for."""
+    assert session.ensure()         # log in before a test injects broker errors
+    ranges = []
+    real = candle_loader.fetch_candles
+
+    def recording(exchange, token, from_dt, to_dt, interval):
+        ranges.append((to_millis(from_dt.replace(tzinfo=IST)), to_millis(to_dt.replace(tzinfo=IST))))
+        return real(exchange, token, from_dt, to_dt, interval)
+
+    monkeypatch.setattr(candle_loader, "fetch_candles", recording)
+    return ranges
+
+
+def broker_calls(fake):
+    return fake.stats()["getCandleData"]["requests"]
+
+
+def test_cold_then_warm(fake, fetches):
+    start, end = ist(2025, 3, 3), ist(2025, 6, 13, 23, 59)
+    before = int(time.time() * 1000)
+    bars = load_candles("NSE", "100001", start, end, "ONE_DAY")
+    assert fetches == [(to_millis(start), to_millis(end))]
+    assert broker_calls(fake) == 1
+    assert len(bars) == weekdays(start, end)
+    assert bars.time[-1] == ms(2025, 6, 13)
+
+    mark = store.watermark("NSE", "100001", "ONE_DAY")
+    assert mark["last_bar"] == ms(2025, 6, 13) and mark["checked_at"] >= before
+    assert store.coverage("NSE", "100001", "ONE_DAY") == [(to_millis(start), to_millis(end))]
+    assert series_version("NSE", "100001", "ONE_DAY") == (mark["last_bar"], mark["checked_at"])
+
+    again = load_candles("NSE", "100001", start, end, "ONE_DAY")
+    assert fetches == [(to_millis(start), to_millis(end))]
+    assert broker_calls(fake) == 1
+    np.testing.assert_array_equal(again.close, bars.close)
+
+
+def test_wider_window_fetches_only_the_older_history(fake, fetches):
+    start, end = ist(2025, 3, 3), ist(2025, 6, 13, 23, 59)
+    load_candles("NSE", "100002", start, end, "ONE_DAY")
+    mark = store.watermark("NSE", "100002", "ONE_DAY")
+
+    wider = ist(2024, 12, 2)
+    bars = load_candles("NSE", "100002", wider, end, "ONE_DAY")
+    assert fetches[1:] == [(to_millis(wider), to_millis(start) - 1)]
+    assert broker_calls(fake) == 2
+    assert len(bars) == weekdays(wider, end)
+    assert store.watermark("NSE", "100002", "ONE_DAY") == mark
+
+
+def test_long_history_is_chunked(fake, fetches):
+    start, end = ist(2014, 1, 1), ist(2025, 6, 13, 23, 59)
+    step = MAX_DAYS_PER_REQUEST["ONE_DAY"] * DAY_MS
+    s, e = to_millis(start), to_millis(end)
+    bars = load_candles("NSE", "100003", start, end, "ONE_DAY")
+    assert fetches == [(s, s + step - 1), (s + step, s + 2 * step - 1), (s + 2 * step, e)]
+    assert broker_calls(fake) == 3
+    assert len(bars) == weekdays(start, end)
+
+
+def test_daily_bar_refetched_after_the_close(fake, fetches):
+    start = ist(2025, 3, 3)
+    load_candles("NSE", "100004", start, ist(2025, 6, 12, 12, 0), "ONE_DAY")
+    # As if that fetch ran at noon on 12 June: the day's bar was still forming
+    forming = CandleSeries([ms(2025, 6, 12)], [1.0], [1.0], [1.0], [1.0], [1.0])
+    store.append("NSE", "100004", "ONE_DAY", forming)
+    store.set_watermark("NSE", "100004", "ONE_DAY", ms(2025, 6, 12), ms(2025, 6, 12, 12, 0))
+    assert series_version("NSE", "100004", "ONE_DAY") is None
+
+    end = ist(2025, 6, 13, 23, 59)
+    bars = load_candles("NSE", "100004", start, end, "ONE_DAY")
+    assert fetches[1:] == [(ms(2025, 6, 12), to_millis(end))]
+    assert broker_calls(fake) == 2
+    assert bars.time[-2:].tolist() == [ms(2025, 6, 12), ms(2025, 6, 13)]
+    assert bars.close[-2] != 1.0
+    assert store.watermark("NSE", "100004", "ONE_DAY")["last_bar"] == ms(2025, 6, 13)
+
+
+def test_failed_chunks_are_retried(fake, fetches):
+    start, end = ist(2025, 3, 3), ist(2025, 6, 12, 12, 0)
+    fake.error_rate = 1.0
+    assert len(load_candles("NSE", "100005", start, end, "ONE_DAY")) == 0
+    assert store.watermark("NSE", "100005", "ONE_DAY") is None
+    assert store.coverage("NSE", "100005", "ONE_DAY") == []
+
+    fake.error_rate = 0.0
+    load_candles("NSE", "100005", start, end, "ONE_DAY")
+    assert fetches == [(to_millis(start), to_millis(end))] * 2
+
+    # A forward fetch that fails leaves the watermark where it was
+    store.set_watermark("NSE", "100005", "ONE_DAY", ms(2025, 6, 12), ms(2025, 6, 12, 12, 0))
+    later = ist(2025, 6, 13, 23, 59)
+    fake.error_rate = 1.0
+    bars = load_candles("NSE", "100005", start, later, "ONE_DAY")
+    assert bars.time[-1] == ms(2025, 6, 12)
+    assert store.watermark("NSE", "100005", "ONE_DAY") == {"last_bar": ms(2025, 6, 12),
+                                                          "checked_at": ms(2025, 6, 12, 12, 0)}
+    fake.error_rate = 0.0
+    bars = load_candles("NSE", "100005", start, later, "ONE_DAY")
+    assert fetches[2:] == [(ms(2025, 6, 12), to_millis(later))] * 2
+    assert bars.time[-1] == ms(2025, 6, 13)
+    assert broker_calls(fake) == 4
+
+
+def test_reloads_when_another_process_moved_the_watermark(fake, fetches):
+    start, end = ist(2025, 3, 3), ist(2025, 6, 13, 23, 59)
+    load_candles("NSE", "100006", start, ist(2025, 6, 12, 23, 59), "ONE_DAY")
+    # The scan worker fetched 13 June in its own process
+    other = CandleSeries([ms(2025, 6, 13)], [10.0], [12.0], [9.0], [11.0], [100.0])
+    store.append("NSE", "100006", "ONE_DAY", other)
+    store.set_watermark("NSE", "100006", "ONE_DAY", ms(2025, 6, 13), int(time.time() * 1000))
+
+    bars = load_candles("NSE", "100006", start, end, "ONE_DAY")
+    assert len(fetches) == 1
+    assert bars.time[-1] == ms(2025, 6, 13) and bars.close[-1] == 11.0
@@ -0,0 +1,56 @@
+"""Compressed responses carry a weak ETag and still revalidate to 304."""
+import gzip
+
+import pytest
+from flask import Flask, Response
+
+import compression
+from shooting_star import not_modified, with_validators
+
+BODY = b"x" * (compression.COMPRESS_MIN_BYTES * 4)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    compression.install(app)
+
+    @app.get("/scan")
+    def scan():
+        if not_modified("v1", None):
+            return with_validators(Response(status=304), "v1", None)
+        return with_validators(Response(BODY, mimetype="application/json"), "v1", None)
+
+    @app.get("/small")
+    def small():
+        return with_validators(Response(b"{}", mimetype="application/json"), "v1", None)
+
+    return app.test_client()
+
+
+def test_compressed_body_gets_a_weak_etag(client):
+    resp = client.get("/scan", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(resp.data) == BODY
+    assert resp.headers["ETag"] == 'W/"v1"'
+    assert "Accept-Encoding" in resp.vary
+
+
+@pytest.mark.parametrize("path, headers", [("/scan", {}), ("/scan", {"Accept-Encoding": "identity"}),
+                                           ("/small", {"Accept-Encoding": "gzip"})])
+def test_identity_body_keeps_the_strong_etag(client, path, headers):
+    resp = client.get(path, headers=headers)
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["ETag"] == '"v1"'
+    assert "Accept-Encoding" in resp.vary
+
+
+@pytest.mark.parametrize("sent", ['W/"v1"', '"v1"'])
+def test_either_tag_revalidates(client, sent):
+    resp = client.get("/scan", headers={"Accept-Encoding": "gzip", "If-None-Match": sent})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == sent
+    assert "Accept-Encoding" in resp.vary
+
+    resp = client.get("/scan", headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"v0"'})
+    assert resp.status_code == 200
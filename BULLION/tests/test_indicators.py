@@ -0,0 +1,65 @@
+"""LiveBars: seeding, ticks into the forming bar, the live Shooting Star and row removal."""
+import numpy as np
+
+from candle_series import CandleSeries
+from indicators import LiveBars
+from resample import DAY_MS, IST_OFFSET_MS
+from shooting_star import analyze_candles
+
+DAY0 = 1_767_205_800_000 - IST_OFFSET_MS + DAY_MS      # 2026-01-01 00:00 IST
+
+
+def daily(closes, star=None):
+    """Daily bars closing at `closes`; `star` (open, high, low, close) is appended as the last bar."""
+    rows = [(c - 0.5, c + 0.5, c - 1.0, c) for c in closes] + ([star] if star else [])
+    o, h, l, c = np.array(rows, dtype=float).T
+    return CandleSeries(DAY0 + np.arange(len(rows)) * DAY_MS, o, h, l, c, np.ones(len(rows)))
+
+
+RISING = [100.0 + i for i in range(9)]
+STAR = (110.0, 116.0, 108.95, 109.0)      # body 1, upper shadow 6, lower shadow 0.05
+
+
+def test_seeded_star_matches_analyze_candles():
+    series = daily(RISING, STAR)
+    bars = LiveBars()
+    bars.seed("1", series, forming=True)
+    expected = analyze_candles("X", series)
+    [signal] = bars.signals()
+    assert expected["eligible"]
+    assert signal["symbol_token"] == "1"
+    assert (signal["entry_sell"], signal["stop_loss"], signal["target"]) == \
+        (expected["entry_sell"], expected["stop_loss"], expected["target"])
+
+
+def test_ticks_shape_the_forming_bar():
+    bars = LiveBars()
+    bars.seed("1", daily(RISING))
+    start = DAY0 + 9 * DAY_MS + 4 * 3_600_000
+    for ltp in (110.0, 116.0, 109.9, 109.0):
+        bars.on_tick("1", ltp, start)
+    assert [s["symbol_token"] for s in bars.signals()] == ["1"]
+    bars.on_tick("1", 117.0, start)                  # close above the open: no longer a star
+    assert bars.signals() == []
+    bars.on_tick("2", 1.0, start)                    # not seeded: ignored
+    assert "2" not in bars.rows
+
+
+def test_remove_moves_the_last_row_into_the_hole():
+    bars = LiveBars(capacity=2)
+    bars.seed("1", daily(RISING))
+    bars.seed("2", daily(RISING, STAR), forming=True)
+    bars.seed("3", daily(RISING, STAR), forming=True)      # grows the arrays
+    bars.remove("1")
+    assert len(bars) == 2 and bars.tokens == ["3", "2"] and bars.rows == {"3": 0, "2": 1}
+    assert sorted(s["symbol_token"] for s in bars.signals()) == ["2", "3"]
+
+    bars.remove("2")
+    bars.remove("unknown")
+    assert bars.tokens == ["3"] and [s["symbol_token"] for s in bars.signals()] == ["3"]
+
+    # a row reused by a new symbol starts empty
+    i = bars.row("4")
+    assert i == 1 and bars.bars[i] == 0 and bars.bar_time[i] == -1 and bars.streak.run[i] == 0
+    assert bars.rsi.moves[i] == 0 and np.isnan(bars.macd.hist[i]) and bars.macd.fast.count[i] == 0
+    assert [s["symbol_token"] for s in bars.signals()] == ["3"]
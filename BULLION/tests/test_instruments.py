@@ -0,0 +1,38 @@
+"""Instrument master refreshes: a failed download is not retried on every lookup."""
+import threading
+
+import instruments
+
+
+def test_failed_refresh_waits_for_cooldown(monkeypatch):
+    calls = []
+    done = threading.Event()
+
+    def failing_refresh():
+        calls.append(1)
+        done.set()
+        raise RuntimeError("scrip master unreachable")
+
+    monkeypatch.setattr(instruments, "refresh", failing_refresh)
+    monkeypatch.setattr(instruments, "_index", None)
+    monkeypatch.setattr(instruments, "_load_file", lambda: None)
+    monkeypatch.setattr(instruments, "_last_failure", 0.0)
+    monkeypatch.setattr(instruments, "_refreshing", False)
+
+    assert instruments.get_index() is None
+    assert done.wait(5)
+    for t in threading.enumerate():
+        if t.name == "instrument-refresh":
+            t.join(5)
+    assert instruments._last_failure > 0
+
+    for _ in range(20):
+        assert instruments.lookup_token("NSE", "SBIN-EQ") is None
+    assert len(calls) == 1
+
+    # once the cooldown has passed the next lookup tries again
+    done.clear()
+    monkeypatch.setattr(instruments, "_last_failure", instruments._last_failure - instruments.REFRESH_RETRY_COOLDOWN)
+    instruments.get_index()
+    assert done.wait(5)
+    assert len(calls) == 2
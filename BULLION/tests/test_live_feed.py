@@ -0,0 +1,112 @@
+"""/ltp and /ltp/batch served from a LiveFeed driven by ReplaySource, and watchlist subscriptions."""
+import time
+
+import pytest
+from sqlalchemy import text
+
+import benchmark
+from indicators import LiveBars
+from live_feed import LiveFeed, ReplaySource
+from test_indicators import daily, RISING, STAR
+
+
+class RecordingReplay(ReplaySource):
+    """ReplaySource that remembers every subscription change."""
+
+    def __init__(self, ticks):
+        super().__init__(ticks, hold=True)
+        self.updates = []
+
+    def update(self, added, removed):
+        self.updates.append((sorted(added), sorted(removed)))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def live(engine, monkeypatch):
+    import main
+    rows = benchmark.seed_list(engine, "live", 0, 3)
+    ticks = [
+        {"token": rows[0]["token"], "ltp": 101.5, "close": 99.0},
+        {"token": rows[1]["token"], "ltp": 55.25, "close": 56.0},
+        {"token": rows[0]["token"], "ltp": 102.0},              # keeps the close from the first tick
+        {"token": "999999", "ltp": 1.0},                        # not in any watchlist: ignored
+    ]
+    source = RecordingReplay(ticks)
+    feed = LiveFeed(source)
+    feed.bars = LiveBars(main.INTERVAL)
+    monkeypatch.setattr(main, "LIVE_FEED", True)
+    monkeypatch.setattr(main, "feed", feed)
+    main.start_live_feed()
+    wait_for(lambda: feed.ticks == 3)
+    yield main.app.test_client(), feed, source, rows
+    feed.stop()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM stocks WHERE list_name = 'live'"))
+        conn.execute(text("DELETE FROM lists WHERE list_name = 'live'"))
+
+
+def test_ltp_from_feed(live):
+    client, feed, _, rows = live
+    resp = client.post("/ltp", json={"tradingsymbol": rows[0]["ts"]})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"name": rows[0]["ts"], "symbol": rows[0]["ts"], "price": 102.0, "last_close": 99.0}
+    assert feed.table.get("999999") is None
+
+
+def test_ltp_batch_from_feed(live):
+    client, _, _, rows = live
+    resp = client.post("/ltp/batch", json={"symbols": [{"tradingsymbol": r["ts"]} for r in rows]})
+    assert resp.status_code == 200
+    assert resp.get_json()["results"] == [
+        {"symbol": rows[0]["ts"], "exchange": "NSE", "price": 102.0, "last_close": 99.0},
+        {"symbol": rows[1]["ts"], "exchange": "NSE", "price": 55.25, "last_close": 56.0},
+        {"symbol": rows[2]["ts"], "exchange": "NSE", "error": "not_streaming"},
+    ]
+
+
+def test_watchlist_changes_update_subscriptions(live):
+    client, feed, source, rows = live
+    assert set(feed.tokens) == {r["token"] for r in rows}
+
+    resp = client.post("/add_stock", json={"list_name": "live", "stock_name": "EXTRA", "exchange": "NSE",
+                                           "trading_symbol": "EXTRA-EQ", "symbol_token": "200001"})
+    assert resp.status_code == 200
+    assert feed.tokens["200001"] == "NSE"
+    wait_for(lambda: source.updates)
+    assert source.updates[-1] == ([("200001", "NSE")], [])
+
+    resp = client.post("/delete_stock", json={"list_name": "live", "trading_symbol": rows[1]["ts"]})
+    assert resp.status_code == 200
+    assert rows[1]["token"] not in feed.tokens
+    wait_for(lambda: len(source.updates) == 2)
+    assert source.updates[-1] == ([], [(rows[1]["token"], "NSE")])
+
+    resp = client.post("/ltp/batch", json={"symbols": [{"tradingsymbol": rows[1]["ts"]}]})
+    assert resp.get_json()["results"][0]["error"] == "not_streaming"
+
+
+def test_live_scan_follows_the_watchlist(live):
+    client, feed, _, rows = live
+    token = rows[2]["token"]
+    wait_for(lambda: token in feed.bars.rows)       # seeded (empty store) on the feed thread
+    feed._on_feed_thread(feed.bars.seed, token, daily(RISING, STAR), True)
+    wait_for(lambda: feed.bars.bars[feed.bars.rows[token]] == 9)
+
+    resp = client.get("/api/live_scan")
+    assert resp.status_code == 200
+    [signal] = resp.get_json()["signals"]
+    assert (signal["symbol"], signal["exchange"], signal["symbol_token"]) == (rows[2]["ts"], "NSE", token)
+
+    resp = client.post("/delete_stock", json={"list_name": "live", "trading_symbol": rows[2]["ts"]})
+    assert resp.status_code == 200
+    assert client.get("/api/live_scan").get_json()["signals"] == []
+    wait_for(lambda: token not in feed.bars.rows)
+    assert len(feed.bars) == 2
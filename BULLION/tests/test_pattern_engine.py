@@ -0,0 +1,93 @@
+"""The batch scan must give exactly the result dicts analyze_candles gives."""
+import random
+import datetime as dt
+
+import pytest
+
+from pattern_engine import CandleBatch, scan_results
+from shooting_star import analyze_candles
+
+DAY = dt.timedelta(days=1)
+START = dt.datetime(2025, 1, 1, tzinfo=dt.timezone(dt.timedelta(hours=5, minutes=30)))
+
+
+def candle(i, o, h, l, c):
+    return {"time": (START + i * DAY).isoformat(), "open": o, "high": h, "low": l, "close": c, "volume": 1000.0}
+
+
+def random_series(rng, n):
+    """A random walk; about a third end in five rising closes and a shooting star."""
+    out, close = [], rng.uniform(20, 2000)
+    for i in range(n):
+        o = round(close * (1 + rng.uniform(-0.02, 0.02)), 2)
+        close = round(close * (1 + rng.uniform(-0.03, 0.03)), 2)
+        out.append(candle(i, o, round(max(o, close) * (1 + rng.uniform(0, 0.02)), 2),
+                          round(min(o, close) * (1 - rng.uniform(0, 0.02)), 2), close))
+    if n >= 7 and rng.random() < 0.35:
+        base = out[n - 7]["close"]
+        for k, i in enumerate(range(n - 6, n - 1)):
+            c = round(base * (1 + 0.01 * (k + 1)), 2)
+            out[i] = candle(i, round(c * 0.995, 2), round(c * 1.005, 2), round(c * 0.99, 2), c)
+        o = out[n - 2]["close"]
+        body = round(o * rng.choice([0.004, 0.01, 0.02]), 2)
+        c = round(o - body, 2)
+        out[n - 1] = candle(n - 1, o, round(o + body * rng.uniform(1.5, 3.5), 2),
+                            round(c - body * rng.uniform(0, 0.2), 2), c)
+    return out
+
+
+def rising(n):
+    return [candle(i, 100 + i, 101.5 + i, 99.5 + i, 100.5 + i) for i in range(n)]
+
+
+def star_after(candles, o, h, l, c):
+    return candles + [candle(len(candles), o, h, l, c)]
+
+
+EDGE_CASES = {
+    "empty": [],
+    "one_bar": rising(1),
+    "nine_bars": rising(9),
+    "nine_bars_with_star": star_after(rising(8), 110, 120, 106.9, 107),
+    "ten_bars_with_star": star_after(rising(9), 110, 120, 106.9, 107),
+    "zero_body": star_after(rising(9), 110, 120, 109, 110),
+    "green_star": star_after(rising(9), 107, 120, 106.9, 110),
+    "shadow_exactly_twice_body": star_after(rising(9), 110, 114, 108, 108),
+    "flat_trend": [candle(i, 100, 101, 99, 100) for i in range(9)] + [candle(9, 110, 120, 106.9, 107)],
+}
+
+
+def assert_batch_matches(symbols, candle_lists):
+    batch = CandleBatch.from_candles(candle_lists)
+    expected = [analyze_candles(s, c) for s, c in zip(symbols, candle_lists)]
+    assert scan_results(symbols, batch) == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_series_match_scalar(seed):
+    rng = random.Random(seed)
+    # Mixed lengths in one batch, so shorter histories are NaN padded on the left
+    lists = [random_series(rng, rng.choice([3, 9, 10, 11, 15, 30, 60])) for _ in range(300)]
+    assert_batch_matches([f"SYM{i}" for i in range(len(lists))], lists)
+    assert any(analyze_candles("x", c)["eligible"] for c in lists)
+
+
+def test_edge_cases_match_scalar():
+    assert_batch_matches(list(EDGE_CASES), list(EDGE_CASES.values()))
+    eligible = {name for name, c in EDGE_CASES.items() if analyze_candles(name, c)["eligible"]}
+    assert eligible == {"ten_bars_with_star", "shadow_exactly_twice_body"}
+
+
+@pytest.mark.parametrize("name", list(EDGE_CASES))
+def test_edge_case_alone_matches_scalar(name):
+    assert_batch_matches([name], [EDGE_CASES[name]])
+
+
+def test_padding_never_qualifies():
+    """A short history next to a long one only sees NaN in its padded bars."""
+    short = star_after(rising(4), 110, 120, 106.9, 107)
+    lists = [short, star_after(rising(40), 150, 170, 146.9, 147)]
+    batch = CandleBatch.from_candles(lists)
+    assert batch.lengths.tolist() == [5, 41]
+    assert_batch_matches(["short", "long"], lists)
+    assert scan_results(["short"], batch)[0]["reason"] == "not_enough_candles"
@@ -0,0 +1,144 @@
+"""RateLimiter on a fake clock: spacing, adaptive slow-down and recovery, and queue depth."""
+import time
+import threading
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, MIN_RATE_FRACTION, MAX_RETRIES
+
+# what SmartConnect raises for FakeSmartAPI's (and SmartAPI's) 403 plain-text reply
+THROTTLED = Exception("Access denied because of exceeding access rate")
+THROTTLED_RESP = {"status": False, "message": "Access denied because of exceeding access rate",
+                  "errorcode": "AB1004", "data": None}
+OK = {"status": True, "data": []}
+
+
+class FakeClock:
+    """Stands in for the time module; sleep() advances it, or blocks until advance() when held."""
+
+    def __init__(self, hold=False):
+        self.now = 1000.0
+        self.hold = hold
+        self.sleeping = 0
+        self._cond = threading.Condition()
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        with self._cond:
+            if not self.hold:
+                self.now += seconds
+                return
+            deadline = self.now + seconds
+            self.sleeping += 1
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self.now >= deadline, timeout=5)
+            self.sleeping -= 1
+
+    def advance(self, seconds):
+        with self._cond:
+            self.now += seconds
+            self._cond.notify_all()
+
+
+def eventually(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_calls_are_spaced_at_the_rate(clock):
+    limiter = RateLimiter({"getCandleData": 4.0})
+    at = []
+    for _ in range(5):
+        limiter.call("getCandleData", lambda: at.append(clock.now) or OK)
+    assert [b - a for a, b in zip(at, at[1:])] == pytest.approx([0.25] * 4)
+    assert limiter.queue_depth() == 0
+
+
+def test_throttled_endpoint_slows_down_then_recovers(clock):
+    limiter = RateLimiter({"getCandleData": 4.0})
+    bucket = limiter.bucket("getCandleData")
+    replies = iter([THROTTLED, THROTTLED_RESP])
+
+    def candles():
+        reply = next(replies, OK)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    assert limiter.call("getCandleData", candles) == OK
+    assert limiter.throttled["getCandleData"] == 2
+    # halved twice, then one success's worth of recovery
+    assert bucket.rate == pytest.approx(4.0 / 4 + 4.0 * rate_limiter.RECOVERY_STEP)
+
+    calls = []
+    while bucket.rate < bucket.configured_rate:
+        rate = bucket.rate
+        limiter.call("getCandleData", lambda: calls.append(clock.now) or OK)
+        assert bucket.rate > rate
+    assert len(calls) == round((1.0 - 0.3) / rate_limiter.RECOVERY_STEP)
+    # calls come closer together as the rate climbs back
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert gaps == sorted(gaps, reverse=True)
+    assert gaps[0] < 1 / 1.2 and gaps[-1] == pytest.approx(1 / 4.0, rel=0.05)
+    assert limiter.metrics()["getCandleData"]["rate"] == 4.0
+
+
+def test_rate_floor_and_retry_limit(clock):
+    limiter = RateLimiter({"searchScrip": 1.0})
+    attempts = []
+
+    def throttled():
+        attempts.append(clock.now)
+        return THROTTLED_RESP
+
+    assert limiter.call("searchScrip", throttled) == THROTTLED_RESP
+    assert len(attempts) == MAX_RETRIES + 1
+    assert limiter.bucket("searchScrip").rate == pytest.approx(MIN_RATE_FRACTION)
+
+    def raises():
+        raise THROTTLED
+
+    with pytest.raises(Exception, match="access rate"):
+        limiter.call("searchScrip", raises)
+    assert limiter.throttled["searchScrip"] == 2 * MAX_RETRIES + 1
+
+
+def test_queue_depth_counts_waiting_callers(monkeypatch):
+    clock = FakeClock(hold=True)
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    limiter = RateLimiter({"getCandleData": 2.0, "ltpData": 10.0})
+    done = []
+    threads = [threading.Thread(target=lambda: done.append(limiter.call("getCandleData", lambda: OK)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+
+    # one token in the bucket; the other four are reserved 0.5s apart
+    eventually(lambda: clock.sleeping == 4)
+    assert limiter.queue_depth("getCandleData") == 4
+    assert limiter.queue_depth("ltpData") == 0
+    assert limiter.queue_depth() == 4
+    assert limiter.metrics()["getCandleData"]["queue_depth"] == 4
+
+    clock.advance(0.5)
+    eventually(lambda: len(done) == 2)
+    assert limiter.queue_depth() == 3
+
+    clock.advance(1.5)
+    for t in threads:
+        t.join(5)
+    assert len(done) == 5 and limiter.queue_depth() == 0
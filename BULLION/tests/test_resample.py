@@ -0,0 +1,59 @@
+"""Resampled stays equal to a stateless resample of its latest base, whatever order bars arrive in."""
+import numpy as np
+
+from candle_series import CandleSeries
+from resample import Resampled, resample_arrays, DAY_MS, IST_OFFSET_MS, OPEN_MS
+
+DAYS = 20
+BARS_PER_DAY = 75       # 09:15-15:30 in five-minute bars
+
+
+def five_minute_days(days=DAYS, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 1_704_067_200_000 - IST_OFFSET_MS      # 2024-01-01 00:00 IST
+    times = np.concatenate([start + d * DAY_MS + OPEN_MS + np.arange(BARS_PER_DAY) * 300_000 for d in range(days)])
+    close = 100 + np.cumsum(rng.normal(0, 1, len(times)))
+    open = close + rng.normal(0, 0.5, len(times))
+    high = np.maximum(open, close) + rng.random(len(times))
+    low = np.minimum(open, close) - rng.random(len(times))
+    return CandleSeries(times, open, high, low, close, rng.integers(1, 1000, len(times)))
+
+
+def day(base, first, last):
+    """Base bars of days first..last (1-based, inclusive)."""
+    return base[(first - 1) * BARS_PER_DAY:last * BARS_PER_DAY]
+
+
+def assert_matches(resampled, base):
+    expected = CandleSeries(*resample_arrays(*base.columns(), resampled.interval))
+    for got, want in zip(resampled.bars.columns(), expected.columns()):
+        np.testing.assert_array_equal(got, want)
+
+
+def test_gap_then_full_history():
+    base = five_minute_days()
+    hourly = Resampled("ONE_HOUR")
+    hourly.update(day(base, 1, 5))
+    hourly.update(day(base, 16, 20))
+    assert_matches(hourly, day(base, 16, 20))
+    hourly.update(base)
+    assert len(hourly.bars) == DAYS * 7
+    assert_matches(hourly, base)
+
+
+def test_incremental_growth():
+    base = five_minute_days()
+    resampled = Resampled("FIFTEEN_MINUTE")
+    for end in range(1, len(base) + 1, 7):
+        resampled.update(base[:end])
+        assert_matches(resampled, base[:end])
+    resampled.update(base)
+    assert_matches(resampled, base)
+
+
+def test_earlier_history_arrives_later():
+    base = five_minute_days()
+    hourly = Resampled("ONE_HOUR")
+    hourly.update(day(base, 11, 20))
+    hourly.update(base)
+    assert_matches(hourly, base)
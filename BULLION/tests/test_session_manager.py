@@ -0,0 +1,68 @@
+"""SessionManager against its own FakeSmartAPI (one login per second, as SmartAPI allows)."""
+import threading
+
+import pytest
+from SmartApi import SmartConnect
+
+from fake_smartapi import FakeSmartAPI
+from session_manager import SessionManager
+
+AUTH_ERROR = {"status": False, "message": "Invalid Token", "errorcode": "AG8001", "data": None}
+
+
+@pytest.fixture
+def broker():
+    fake = FakeSmartAPI(0, 0)
+    root = fake.start()
+    manager = SessionManager(SmartConnect("bench", root=root), "BENCH", "0000", "JBSWY3DPEHPK3PXP")
+    yield fake, manager
+    fake.stop()
+
+
+def logins(fake):
+    return fake.stats()["login"]["requests"]
+
+
+def test_one_login_under_concurrent_ensure(broker):
+    fake, manager = broker
+    start = threading.Barrier(32)
+    results = []
+
+    def ensure():
+        start.wait()
+        results.append(manager.ensure())
+
+    threads = [threading.Thread(target=ensure) for _ in range(32)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results == [True] * 32
+    assert manager.login_count == 1 and logins(fake) == 1
+
+
+def test_relogin_once_on_auth_error(broker):
+    fake, manager = broker
+    calls = []
+
+    def rejected_once():
+        calls.append(manager.jwt_token)
+        return AUTH_ERROR if len(calls) == 1 else {"status": True, "data": "ok"}
+
+    # the auth error arrives right after the first login, inside the broker's login limit
+    assert manager.call(rejected_once) == {"status": True, "data": "ok"}
+    assert len(calls) == 2
+    assert manager.login_count == 2 and manager.login_failures == 0
+    assert fake.stats()["login"]["throttled"] == 0 and logins(fake) == 2
+
+
+def test_second_auth_error_is_returned_not_retried(broker):
+    fake, manager = broker
+    calls = []
+
+    def always_rejected():
+        calls.append(1)
+        return AUTH_ERROR
+
+    assert manager.call(always_rejected) == AUTH_ERROR
+    assert len(calls) == 2 and manager.login_count == 2
@@ -0,0 +1,27 @@
+"""Cached watchlists are dropped when another process changes a list."""
+from sqlalchemy import text
+
+import benchmark
+import scan_cache
+
+
+def test_stamp_invalidates_cached_watchlist(engine):
+    import shooting_star
+    rows = benchmark.seed_list(engine, "stamped", 0, 2)
+    try:
+        assert len(shooting_star.get_watchlist("stamped")) == 2
+
+        # the API process adds a stock: its own cache is cleared, ours only sees the stamp move
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO stocks (list_name, stock_name, exchange, trading_symbol, symbol_token) "
+                              "VALUES ('stamped', 'EXTRA', 'NSE', 'EXTRA-EQ', '200002')"))
+        assert len(shooting_star.get_watchlist("stamped")) == 2     # still cached
+        before = scan_cache.watchlist_stamp()
+        scan_cache.touch_watchlist_stamp()
+        assert scan_cache.watchlist_stamp() > before
+        symbols = [r["trading_symbol"] for r in shooting_star.get_watchlist("stamped")]
+        assert symbols == [r["ts"] for r in rows] + ["EXTRA-EQ"]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM stocks WHERE list_name = 'stamped'"))
+            conn.execute(text("DELETE FROM lists WHERE list_name = 'stamped'"))
@@ -1,3 +1,6 @@
+// Last finished scan per list, replayed when the server answers 304
+const lastScans = {};
+
 document.getElementById("startBtn").addEventListener("click", () => {
     const trend = document.getElementById("trend").value;
     const algorithm = document.getElementById("algorithm").value;
@@ -8,20 +11,59 @@ document.getElementById("startBtn").addEventListener("click", () => {
         return;
     }
 
-    fetch("http://127.0.0.1:5005/api/shooting_star", {
+    const data = { eligible: [], rejected: [], count: { eligible: 0, rejected: 0, total: 0 } };
+    const headers = { "Content-Type": "application/json" };
+    if (lastScans[list]) headers["If-None-Match"] = `"${lastScans[list].etag}"`;
+
+    fetch("http://127.0.0.1:5005/api/shooting_star/stream", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers,
         body: JSON.stringify({ list })
     })
-    .then(res => res.json())
-    .then(data => {
-        displayResults(data);
+    .then(res => {
+        if (res.status === 304) {
+            displayResults(lastScans[list].data);
+            return;
+        }
+        const etag = (res.headers.get("ETag") || "").replace(/"/g, "");
+        return readLines(res, line => onLine(line, etag));
     })
     .catch(err => {
         console.error("Error:", err);
     });
+
+    function onLine(line, etag) {
+        const item = JSON.parse(line);
+        if (item.done) {
+            data.count = item.count;
+            etag = item.etag || etag;
+            if (etag) lastScans[list] = { etag, data };
+        } else {
+            (item.eligible ? data.eligible : data.rejected).push(item);
+            data.count.eligible = data.eligible.length;
+            data.count.rejected = data.rejected.length;
+            data.count.total = data.eligible.length + data.rejected.length;
+        }
+        displayResults(data);
+    }
 });
 
+async function readLines(res, onLine) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.filter(l => l.trim()).forEach(onLine);
+    }
+    if (buffer.trim()) onLine(buffer);
+}
+
 function displayResults(data) {
     const resultDiv = document.querySelector(".result");
     resultDiv.innerHTML = ""; 